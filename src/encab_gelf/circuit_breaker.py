@@ -0,0 +1,77 @@
+import time
+import random
+
+from threading import Lock
+
+
+class CircuitBreaker(object):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+    ) -> None:
+        """
+        Stops calls to an unreachable server.
+
+        After failure_threshold consecutive failures the breaker opens and no call
+        is allowed until the retry delay has passed. Then a single probe call is
+        allowed (half open). If it succeeds, the breaker closes again,
+        otherwise it opens with twice the delay, up to max_retry_delay.
+        Delays are jittered so several handlers don't probe at the same time.
+
+        :param failure_threshold: number of consecutive failures that open the breaker
+        :param retry_delay: seconds to wait before the first probe
+        :param max_retry_delay: maximum seconds to wait before a probe
+        """
+        self.failure_threshold = failure_threshold
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.state = self.CLOSED
+        self.failures: int = 0
+        self.delay: float = retry_delay
+        self.retry_at: float = 0.0
+        self.lock = Lock()
+
+    def allow(self) -> bool:
+        """
+        :return: True if a call may be made. The result of the call must be
+            reported by succeeded or failed
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def succeeded(self) -> None:
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.delay = self.retry_delay
+
+    def failed(self) -> bool:
+        """
+        :return: True if the breaker opened
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return False
+
+            if self.state == self.HALF_OPEN:
+                self.delay = min(self.delay * 2, self.max_retry_delay)
+
+            self.state = self.OPEN
+            self.retry_at = time.monotonic() + random.uniform(
+                self.delay / 2, self.delay
+            )
+            return True
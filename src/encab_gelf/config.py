@@ -2,7 +2,7 @@ import yaml
 import marshmallow_dataclass
 import json
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from logging import getLogger
 
 from dataclasses import dataclass, field
@@ -29,6 +29,53 @@ class RecognizerSettings(ABC):
     # see: https://pypi.org/project/pygrok/
 
 
+@dataclass
+class FieldSettings(ABC):
+    include: Optional[List[str]] = field(default=None)
+    # names of the fields to keep. All fields are kept if not set (default)
+    exclude: List[str] = field(default_factory=lambda: list())
+    # names of the fields to drop
+    rename: Dict[str, str] = field(default_factory=lambda: dict())
+    # maps field names to GELF field names
+    prefix: bool = field(default=False)
+    # (False by default) - if true, add an underscore to field names that don't start with one
+
+    def is_identity(self) -> bool:
+        return (
+            self.include is None
+            and not self.exclude
+            and not self.rename
+            and not self.prefix
+        )
+
+
+@dataclass
+class FilterSettings(ABC):
+    min_level: Optional[str] = field(default=None)
+    # log lines with a lower level, e.g. ``DEBUG`` if ``INFO``, are not sent. All are sent if not set (default)
+    include: Optional[List[str]] = field(default=None)
+    # names of the programs whose log lines are sent. All are sent if not set (default)
+    exclude: List[str] = field(default_factory=lambda: list())
+    # names of the programs whose log lines are not sent
+    exclude_messages: List[str] = field(default_factory=lambda: list())
+    # regular expressions, log lines that start with a match are not sent
+
+
+@dataclass
+class RateLimitSettings(ABC):
+    rate: float = field(default=0.0)
+    # log lines per second and program. 0 - unlimited (default)
+    burst: int = field(default=0)
+    # number of log lines a program may send at once, ``rate`` if lower (default)
+    levels: Dict[str, float] = field(default_factory=lambda: dict())
+    # log lines per second and program by level name, overrides ``rate``. 0 - unlimited
+    summary_interval: float = field(default=60.0)
+    # (60 by default) - seconds between the warnings that report the number of dropped log lines
+
+    def is_unlimited(self) -> bool:
+        return self.rate <= 0 and not any(rate > 0 for rate in self.levels.values())
+
+
 @dataclass
 class GelfHandlerSettings(ABC):
     protocol: str
@@ -41,6 +88,9 @@ class GelfHandlerSettings(ABC):
     # optional gelf fields as dictionary. Will be added to each log record.
     enabled: bool = field(default=True)
     # True - the handler is enabled (default), False - the handler is disabled
+    json_encoder: str = field(default="auto")
+    # JSON encoder: ``auto`` (default) - orjson if installed, otherwise json,
+    # ``json`` - json module of the standard library, ``orjson`` - orjson
 
     # -- HTTP
 
@@ -50,6 +100,17 @@ class GelfHandlerSettings(ABC):
     # (True by default) - if true, compress log messages before sending them to the server
     timeout: float = field(default=5.0)
     # (5 by default) - amount of seconds that HTTP client should wait before it discards the request if the server doesn't respond
+    pool_size: int = field(default=2)
+    # (2 by default) - maximum number of idle keep-alive connections kept open to the server
+    batch: bool = field(default=False)
+    # (False by default) - if true, send log messages in newline delimited batches.
+    # The GELF HTTP input must have bulk receiving enabled
+    batch_max_records: int = field(default=100)
+    # (100 by default) - maximum number of log messages in a batch
+    batch_max_bytes: int = field(default=1048576)
+    # (1 MiB by default) - maximum size of the uncompressed batch in bytes
+    batch_max_age: float = field(default=1.0)
+    # (1 by default) - maximum amount of seconds a log message waits in a batch before it is sent
 
     # -- UDP
 
@@ -64,6 +125,14 @@ class GelfHandlerSettings(ABC):
     ca_certs: Optional[str] = field(default=None)
     # path to CA bundle file. For instance, on CentOS it would be '/etc/pki/tls/certs/ca-bundle.crt'
 
+    # -- TCP, TLS
+
+    write_buffer_size: int = field(default=0)
+    # (0 by default) - if greater than 0, log messages are collected and written at once
+    # when this many bytes are buffered or write_linger has passed
+    write_linger: float = field(default=0.05)
+    # (0.05 by default) - maximum amount of seconds a log message waits in the write buffer
+
     # -- TLS
 
     # path to CA bundle file. For instance, on CentOS it would be '/etc/pki/tls/certs/ca-bundle.crt'
@@ -72,8 +141,66 @@ class GelfHandlerSettings(ABC):
     keyfile: Optional[str] = field(default=None)
     # path to the private key. If the private key is stored with the certificate, this parameter can be ignored
 
+    # -- asynchronous delivery
+
+    asynchronous: bool = field(default=False)
+    # (False by default) - if true, log records are sent by a background thread
+    queue_size: int = field(default=1000)
+    # (1000 by default) - maximum number of log records waiting to be sent
+    overflow: str = field(default="block")
+    # what to do if the queue is full: ``block`` (default), ``drop_newest`` or ``drop_oldest``
+
+    # -- circuit breaker
+
+    circuit_breaker: bool = field(default=True)
+    # (True by default) - if true, stop sending for a while after the server was unreachable
+    failure_threshold: int = field(default=3)
+    # (3 by default) - number of consecutive connection failures that stop sending
+    retry_delay: float = field(default=1.0)
+    # (1 by default) - amount of seconds before sending is tried again. Doubles with every failed try
+    max_retry_delay: float = field(default=60.0)
+    # (60 by default) - maximum amount of seconds before sending is tried again
+
+    # -- spool
+
+    spool_dir: Optional[str] = field(default=None)
+    # directory where log records are kept while the server is unreachable.
+    # Each handler uses a subdirectory named after the handler. No spool if not set (default)
+    spool_max_bytes: int = field(default=67108864)
+    # (64 MiB by default) - maximum size of the spool. If exceeded, the oldest log records are deleted
+    spool_segment_bytes: int = field(default=4194304)
+    # (4 MiB by default) - size of a spool file at which a new one is started
+
     recognizer: RecognizerSettings = field(default_factory=lambda: RecognizerSettings())
     # log line recognizer settings
+    multiline_max_lines: int = field(default=1000)
+    # (1000 by default) - maximum number of lines joined into one log message
+    multiline_max_bytes: int = field(default=1048576)
+    # (1 MiB by default) - maximum number of characters joined into one log message
+    multiline_timeout: float = field(default=0.5)
+    # (0.5 by default) - maximum amount of seconds a log line waits for continuation lines
+    multiline_continuation: Optional[str] = field(default=None)
+    # regular expression of continuation lines, e.g. ``^(\s|Caused by:)``
+    multiline_early_flush: bool = field(default=False)
+    # (False by default) - if true, log lines are sent at once instead of waiting for continuation lines
+    filter: FilterSettings = field(default_factory=lambda: FilterSettings())
+    # selects the log lines that are sent
+    fields: FieldSettings = field(default_factory=lambda: FieldSettings())
+    # selects and renames the fields of log records, e.g. the attributes found by the recognizer
+    max_message_length: int = field(default=0)
+    # maximum length of the log message, longer ones are truncated. 0 - unlimited (default)
+    max_full_message_length: int = field(default=0)
+    # maximum length of the full message, e.g. a stack trace. 0 - unlimited (default)
+    max_field_length: int = field(default=0)
+    # maximum length of each other text field. 0 - unlimited (default)
+    repeat_window: float = field(default=0.0)
+    # if greater than 0, repetitions of a log message in this amount of seconds are sent
+    # as a single log message with the repeat count. 0 - never collapsed (default)
+    rate_limit: RateLimitSettings = field(default_factory=lambda: RateLimitSettings())
+    # limits the number of log lines per program and level
+    exception_window: float = field(default=0.0)
+    # if greater than 0, the full trace of an exception is sent only once in this amount of seconds.
+    # Repetitions are sent with the exception fingerprint and repeat count. 0 - always (default)
 
     def host_url(self) -> str:
         return f"{self.protocol.lower()}://{self.host}:{self.port}{self.path}"
@@ -115,7 +242,13 @@ class GelfSettings(object):
     GRAYLOG_OPTIONAL_FIELDS = "GRAYLOG_OPTIONAL_FIELDS"
     DEFAULT_HANDLER = "default"
 
+    THREADED_ENGINE = "threaded"
+    ASYNCIO_ENGINE = "asyncio"
+
     handlers: Dict[str, GelfHandlerSettings]
+    engine: str = field(default=THREADED_ENGINE)
+    # transport engine: ``threaded`` (default) - each handler sends on the logging thread
+    # or its own background thread, ``asyncio`` - all handlers share one asyncio event loop
 
     def update_default_handler(self, environment: Dict[str, Any]) -> None:
         set_default_handler = False
@@ -1,13 +1,33 @@
-from typing import Dict, Any, Optional, Iterator
+import os
+import re
+import json
+import dataclasses
 
-from logging import getLogger, Logger, Handler, DEBUG
+from typing import Callable, Dict, Any, List, Optional, Iterator, Pattern, Union
+
+from logging import getLogger, Logger, DEBUG
 from pluggy import HookimplMarker  # type: ignore
 
-from .log_line_recognizer import LogLineRecognizer, DefaultRecognizer, GrokRecognizer
+from .log_line_recognizer import (
+    LogLevel,
+    LogLineRecognizer,
+    DefaultRecognizer,
+    GrokRecognizer,
+)
+from .spool import Spool
+from .circuit_breaker import CircuitBreaker
+from .rate_limit import RateLimitStage
+from .repeat import RepeatStage
+from .filter import FilterStage
 from .handlers import (
-    MultiLineHandler,
+    Pipeline,
+    Stage,
+    MultiLineStage,
+    RecognizingStage,
     ErrorHandler,
-    RecognizingHandler,
+    ErrorReporter,
+    AsyncHandler,
+    FanOutHandler,
     ENCAB,
     ENCAB_GELF,
 )
@@ -18,6 +38,17 @@ from .gelf.handlers import (
     GelfHttpsHandler,
     GelfTcpHandler,
     GelfTlsHandler,
+    create_ssl_context,
+)
+from .gelf import encoders
+from .gelf.gelf import Projection, SizeBudget
+from .gelf.engine import (
+    TransportEngine,
+    Output,
+    UdpOutput,
+    TcpOutput,
+    HttpOutput,
+    GelfEngineHandler,
 )
 
 from .config import RecognizerSettings, GelfHandlerSettings, GelfSettings, ConfigError
@@ -46,24 +77,182 @@ class RecognizerFactory(object):
 class GelfLogHandlerFactory(object):
     def __init__(self, gelf_settings: GelfSettings) -> None:
         self.gelf_settings = gelf_settings
+        self.engine: Optional[TransportEngine] = None
+        self.engine_outputs: Dict[str, Output] = dict()
+        self.spools: Dict[str, Spool] = dict()
+        self.breakers: Dict[str, CircuitBreaker] = dict()
 
     def update_settings(self, gelf_settings: GelfSettings) -> None:
         self.gelf_settings = gelf_settings
 
+    def uses_engine(self) -> bool:
+        engine = self.gelf_settings.engine
+        if engine not in (GelfSettings.THREADED_ENGINE, GelfSettings.ASYNCIO_ENGINE):
+            raise ConfigError(f"Unsupported engine {engine}")
+        return engine == GelfSettings.ASYNCIO_ENGINE
+
+    def compresses(self, settings: GelfHandlerSettings) -> bool:
+        """:return: True if the handler compresses each message"""
+        # TCP inputs don't accept compressed messages, batches are compressed as a whole
+        return (
+            settings.compress
+            and settings.protocol not in ("TCP", "TLS")
+            and not (settings.batch and settings.protocol in ("HTTP", "HTTPS"))
+        )
+
+    def payloadKey(self, settings: GelfHandlerSettings) -> str:
+        """
+        :return: a key that is equal for handlers that recognize log lines
+            the same way and create the same GELF payload
+        """
+        return json.dumps(
+            [
+                settings.recognizer.type,
+                settings.recognizer.pattern,
+                settings.multiline_max_lines,
+                settings.multiline_max_bytes,
+                settings.multiline_timeout,
+                settings.multiline_continuation,
+                settings.multiline_early_flush,
+                settings.optional_fields,
+                dataclasses.asdict(settings.filter),
+                dataclasses.asdict(settings.fields),
+                settings.repeat_window,
+                dataclasses.asdict(settings.rate_limit),
+                settings.max_message_length,
+                settings.max_full_message_length,
+                settings.max_field_length,
+                settings.exception_window,
+                settings.json_encoder,
+                self.compresses(settings),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+
+    def createEngineOutput(self, settings: GelfHandlerSettings) -> Output:
+        if settings.protocol == "UDP":
+            return UdpOutput(
+                settings.host, settings.port, settings.chunk_size, settings.queue_size
+            )
+        elif settings.protocol in ("TCP", "TLS"):
+            ssl_context = None
+            if settings.protocol == "TLS":
+                ssl_context = create_ssl_context(
+                    settings.validate,
+                    settings.ca_certs,
+                    settings.certfile,
+                    settings.keyfile,
+                )
+            return TcpOutput(
+                settings.host, settings.port, ssl_context, settings.queue_size
+            )
+        else:
+            ssl_context = None
+            if settings.protocol == "HTTPS":
+                ssl_context = create_ssl_context(settings.validate, settings.ca_certs)
+            return HttpOutput(
+                settings.host,
+                settings.port,
+                path=settings.path,
+                ssl_context=ssl_context,
+                compress=settings.compress,
+                timeout=settings.timeout,
+                concurrency=settings.pool_size,
+                buffer_size=settings.queue_size,
+                batch=settings.batch,
+                batch_max_records=settings.batch_max_records,
+                batch_max_bytes=settings.batch_max_bytes,
+            )
+
+    def createEngineHandler(
+        self, name: str, settings: GelfHandlerSettings
+    ) -> GelfEngineHandler:
+        if self.engine is None or self.engine.closed:
+            self.engine = TransportEngine()
+            self.engine_outputs = dict()
+
+        output = self.engine_outputs.get(name)
+        if output is None:
+            output = self.createEngineOutput(settings)
+            # the output is shared by the handlers of all programs, so is its reporter
+            output.on_error = ErrorReporter(name, settings.host_url()).report
+            self.engine_outputs[name] = self.engine.add(output)
+
+        return GelfEngineHandler(
+            self.engine,
+            output,
+            compress=self.compresses(settings),
+            **self.baseArguments(settings),
+        )
+
+    def createContinuation(
+        self, settings: GelfHandlerSettings
+    ) -> Optional[Pattern[str]]:
+        if not settings.multiline_continuation:
+            return None
+        try:
+            return re.compile(settings.multiline_continuation)
+        except re.error as e:
+            raise ConfigError(f"Invalid multiline_continuation pattern: {e}")
+
+    def createProjection(self, settings: GelfHandlerSettings) -> Optional[Projection]:
+        fields = settings.fields
+        if fields.is_identity():
+            return None
+        return Projection(fields.include, fields.exclude, fields.rename, fields.prefix)
+
+    def createSizeBudget(self, settings: GelfHandlerSettings) -> Optional[SizeBudget]:
+        if not (
+            settings.max_message_length
+            or settings.max_full_message_length
+            or settings.max_field_length
+        ):
+            return None
+        return SizeBudget(
+            settings.max_message_length,
+            settings.max_full_message_length,
+            settings.max_field_length,
+        )
+
+    def baseArguments(self, settings: GelfHandlerSettings) -> Dict[str, Any]:
+        """:return: the arguments all GELF handlers have in common"""
+        return dict(
+            json_encoder=settings.json_encoder,
+            projection=self.createProjection(settings),
+            size_budget=self.createSizeBudget(settings),
+            exception_window=settings.exception_window,
+            **settings.optional_fields,
+        )
+
+    def checkEncoder(self, settings: GelfHandlerSettings) -> None:
+        if settings.json_encoder not in encoders.ENCODERS:
+            raise ConfigError(f"Unsupported JSON encoder {settings.json_encoder}")
+        if settings.json_encoder == encoders.ORJSON and encoders.orjson is None:
+            raise ConfigError("JSON encoder orjson is not installed")
+
     def create(self, name: str, settings: GelfHandlerSettings):
         mylogger.info(
             f"Configuring GELF filter {name}: {settings.log_info()}",
             extra={"program": ENCAB_GELF},
         )
         assert settings.protocol in ["HTTP", "HTTPS", "UDP", "TCP", "TLS"]
-        if settings.protocol == "HTTP":
+        self.checkEncoder(settings)
+        if self.uses_engine():
+            return self.createEngineHandler(name, settings)
+        elif settings.protocol == "HTTP":
             return GelfHttpHandler(
                 host=settings.host,
                 port=settings.port,
                 compress=settings.compress,
                 path=settings.path,
                 timeout=settings.timeout,
-                **settings.optional_fields,
+                pool_size=settings.pool_size,
+                batch=settings.batch,
+                batch_max_records=settings.batch_max_records,
+                batch_max_bytes=settings.batch_max_bytes,
+                batch_max_age=settings.batch_max_age,
+                **self.baseArguments(settings),
             )
         elif settings.protocol == "HTTPS":
             return GelfHttpsHandler(
@@ -72,9 +261,14 @@ class GelfLogHandlerFactory(object):
                 compress=settings.compress,
                 path=settings.path,
                 timeout=settings.timeout,
+                pool_size=settings.pool_size,
+                batch=settings.batch,
+                batch_max_records=settings.batch_max_records,
+                batch_max_bytes=settings.batch_max_bytes,
+                batch_max_age=settings.batch_max_age,
                 validate=settings.validate,
                 ca_certs=settings.ca_certs,
-                **settings.optional_fields,
+                **self.baseArguments(settings),
             )
         elif settings.protocol == "UDP":
             return GelfUdpHandler(
@@ -82,11 +276,15 @@ class GelfLogHandlerFactory(object):
                 port=settings.port,
                 compress=settings.compress,
                 chunk_size=settings.chunk_size,
-                **settings.optional_fields,
+                **self.baseArguments(settings),
             )
         elif settings.protocol == "TCP":
             return GelfTcpHandler(
-                host=settings.host, port=settings.port, **settings.optional_fields
+                host=settings.host,
+                port=settings.port,
+                write_buffer_size=settings.write_buffer_size,
+                write_linger=settings.write_linger,
+                **self.baseArguments(settings),
             )
         elif settings.protocol == "TLS":
             return GelfTlsHandler(
@@ -96,24 +294,205 @@ class GelfLogHandlerFactory(object):
                 ca_certs=settings.ca_certs,
                 certfile=settings.certfile,
                 keyfile=settings.keyfile,
-                **settings.optional_fields,
+                write_buffer_size=settings.write_buffer_size,
+                write_linger=settings.write_linger,
+                **self.baseArguments(settings),
+            )
+
+    def checkSpool(self, settings: GelfHandlerSettings) -> None:
+        if not settings.spool_dir:
+            return
+
+        if self.uses_engine():
+            raise ConfigError("spool_dir is not supported by the asyncio engine")
+
+        # UDP reports a refused datagram with the next send, which may be delivered anyway
+        # once the input is back, so a spooled message could be sent twice
+        if settings.protocol == "UDP":
+            raise ConfigError("spool_dir is not supported by UDP")
+
+        # buffered messages are written later, so a failure can't be traced to the message to spool
+        if settings.batch and settings.protocol in ("HTTP", "HTTPS"):
+            raise ConfigError("spool_dir is not supported together with batch")
+        if settings.write_buffer_size > 0 and settings.protocol in ("TCP", "TLS"):
+            raise ConfigError(
+                "spool_dir is not supported together with write_buffer_size"
             )
 
-    def createAll(self) -> Iterator[Handler]:
+    def createSpool(self, name: str, settings: GelfHandlerSettings) -> Optional[Spool]:
+        if not settings.spool_dir:
+            return None
+        self.checkSpool(settings)
+
+        # the handlers of all programs share the spool of their settings
+        spool = self.spools.get(name)
+        if spool is None:
+            spool = Spool(
+                os.path.join(settings.spool_dir, name),
+                settings.spool_max_bytes,
+                settings.spool_segment_bytes,
+            )
+            self.spools[name] = spool
+        return spool
+
+    def createBreaker(
+        self, name: str, settings: GelfHandlerSettings
+    ) -> Optional[CircuitBreaker]:
+        # the asyncio engine retries with its own backoff
+        if not settings.circuit_breaker or self.uses_engine():
+            return None
+
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                settings.failure_threshold,
+                settings.retry_delay,
+                settings.max_retry_delay,
+            )
+            self.breakers[name] = breaker
+        return breaker
+
+    def createOutput(
+        self, name: str, settings: GelfHandlerSettings
+    ) -> Union[ErrorHandler, AsyncHandler]:
+        spool = self.createSpool(name, settings)
+        breaker = self.createBreaker(name, settings)
+        handler = self.create(name, settings)
+        error_handler = ErrorHandler(handler, name, settings.host_url(), spool, breaker)
+
+        if isinstance(handler, GelfEngineHandler):
+            # the engine sends asynchronously and reports errors from its event loop
+            return error_handler
+
+        if not settings.asynchronous:
+            return error_handler
+
+        self.checkOverflow(settings)
+
+        return AsyncHandler(
+            handler, error_handler, settings.queue_size, settings.overflow
+        )
+
+    def checkOverflow(self, settings: GelfHandlerSettings) -> None:
+        if settings.overflow not in AsyncHandler.OVERFLOW_POLICIES:
+            raise ConfigError(f"Unsupported overflow policy {settings.overflow}")
+
+    def createMultiLineStage(self, settings: GelfHandlerSettings) -> Optional[Stage]:
+        return MultiLineStage(
+            timeout=settings.multiline_timeout,
+            max_lines=settings.multiline_max_lines,
+            max_bytes=settings.multiline_max_bytes,
+            # only lines that match the continuation pattern are recognized
+            recognizer=(
+                RecognizerFactory(settings.recognizer).create()
+                if settings.multiline_continuation
+                else None
+            ),
+            continuation=self.createContinuation(settings),
+            early_flush=settings.multiline_early_flush,
+        )
+
+    def createRecognizingStage(self, settings: GelfHandlerSettings) -> Optional[Stage]:
+        return RecognizingStage(RecognizerFactory(settings.recognizer).create())
+
+    def createProgramFilterStage(
+        self, settings: GelfHandlerSettings
+    ) -> Optional[Stage]:
+        filter_settings = settings.filter
+        if (
+            filter_settings.include is None
+            and not filter_settings.exclude
+            and not filter_settings.exclude_messages
+        ):
+            return None
+        try:
+            return FilterStage(
+                include=filter_settings.include,
+                exclude=filter_settings.exclude,
+                exclude_messages=filter_settings.exclude_messages,
+            )
+        except re.error as e:
+            raise ConfigError(f"Invalid exclude_messages pattern: {e}")
+
+    def createLevelFilterStage(self, settings: GelfHandlerSettings) -> Optional[Stage]:
+        if not settings.filter.min_level:
+            return None
+        level = LogLevel.fromString(settings.filter.min_level)
+        if level is None:
+            raise ConfigError(f"Unsupported log level {settings.filter.min_level}")
+        return FilterStage(min_level=level.value)
+
+    def createRepeatStage(self, settings: GelfHandlerSettings) -> Optional[Stage]:
+        if settings.repeat_window <= 0:
+            return None
+        return RepeatStage(settings.repeat_window)
+
+    def createRateLimitStage(self, settings: GelfHandlerSettings) -> Optional[Stage]:
+        rate_limit = settings.rate_limit
+        if rate_limit.is_unlimited():
+            return None
+        return RateLimitStage(
+            rate_limit.rate,
+            rate_limit.burst,
+            rate_limit.levels,
+            rate_limit.summary_interval,
+        )
+
+    def createStages(self, settings: GelfHandlerSettings) -> List[Stage]:
+        """
+        :return: the stages of the pipeline of a handler, in the order records pass them
+        """
+        factories: List[Callable[[GelfHandlerSettings], Optional[Stage]]] = [
+            self.createMultiLineStage,
+            # drops records before they are recognized
+            self.createProgramFilterStage,
+            self.createRepeatStage,
+            self.createRecognizingStage,
+            # filters and limits by the recognized level
+            self.createLevelFilterStage,
+            self.createRateLimitStage,
+        ]
+        stages = [factory(settings) for factory in factories]
+        # stages that are disabled in the settings are None
+        return [stage for stage in stages if stage is not None]
+
+    def validate(self) -> None:
+        """
+        checks the settings of the enabled handlers without connecting to a server,
+        raises a ConfigError on the first invalid setting
+        """
+        self.uses_engine()
         for name, settings in self.gelf_settings.handlers.items():
             if not settings.enabled:
                 continue
-
-            recognizers = RecognizerFactory(settings.recognizer)
-            yield MultiLineHandler(
-                name,
-                RecognizingHandler(
-                    ErrorHandler(
-                        self.create(name, settings), name, settings.host_url()
-                    ),
-                    name,
-                    recognizers.create(),
-                ),
+            self.checkEncoder(settings)
+            if settings.asynchronous:
+                self.checkOverflow(settings)
+            self.checkSpool(settings)
+            # compiles the patterns and resolves the level, the other stages can't fail
+            RecognizerFactory(settings.recognizer).create()
+            self.createContinuation(settings)
+            self.createProgramFilterStage(settings)
+            self.createLevelFilterStage(settings)
+
+    def createAll(self) -> Iterator[Pipeline]:
+        # handlers with the same payload share recognition and serialization
+        groups: Dict[str, List[str]] = dict()
+        for name, settings in self.gelf_settings.handlers.items():
+            if settings.enabled:
+                groups.setdefault(self.payloadKey(settings), list()).append(name)
+
+        for names in groups.values():
+            settings = self.gelf_settings.handlers[names[0]]
+            outputs = [
+                self.createOutput(name, self.gelf_settings.handlers[name])
+                for name in names
+            ]
+
+            yield Pipeline(
+                names[0],
+                self.createStages(settings),
+                outputs[0] if len(outputs) == 1 else FanOutHandler(outputs),
             )
 
 
@@ -124,9 +503,11 @@ class GelfExtension:
     def __init__(self) -> None:
         self.settings: Optional[GelfSettings] = None
         self.factory: Optional[GelfLogHandlerFactory] = None
+        self.handlers: List[Pipeline] = list()
+        # the handlers added to the loggers of the programs
 
     def validate_settings(self, settings: Dict[str, Any]) -> None:
-        GelfSettings.load(settings)
+        GelfLogHandlerFactory(GelfSettings.load(settings)).validate()
 
     def update_settings(self, settings: Dict[str, Any]) -> None:
         self.settings = GelfSettings.load(settings)
@@ -140,6 +521,11 @@ class GelfExtension:
     def is_enabled(self) -> bool:
         return self.settings is not None
 
+    def refresh_environment(self) -> None:
+        """reads the environment fields of all handlers again, e.g. after os.environ changed"""
+        for handler in self.handlers:
+            handler.refresh_environment()
+
 
 extension = GelfExtension()
 
@@ -207,5 +593,6 @@ def update_logger(program_name: str, logger: Logger):
     mylogger.info("Adding GELF Handlers", extra={"program": ENCAB_GELF})
 
     assert extension.factory
-    for hander in extension.factory.createAll():
-        logger.addHandler(hander)
+    for handler in extension.factory.createAll():
+        logger.addHandler(handler)
+        extension.handlers.append(handler)
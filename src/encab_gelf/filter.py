@@ -0,0 +1,51 @@
+from typing import List, Optional, Pattern
+
+import re
+
+from .handlers import Stage, ExtLogRecord
+
+
+class FilterStage(Stage):
+    def __init__(
+        self,
+        min_level: int = 0,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        exclude_messages: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Drops log records a handler doesn't send.
+
+        :param min_level: records with a lower level are dropped
+        :param include: names of the programs whose records are kept. All are kept if not set
+        :param exclude: names of the programs whose records are dropped
+        :param exclude_messages: regular expressions, records with a message that starts with a match are dropped
+        """
+        super().__init__()
+        self.min_level = min_level
+        self.include = frozenset(include) if include is not None else None
+        self.exclude = frozenset(exclude or ())
+        self.exclude_messages: Optional[Pattern[str]] = None
+        if exclude_messages:
+            # a single pattern is matched once instead of once per expression
+            self.exclude_messages = re.compile(
+                "|".join(f"(?:{pattern})" for pattern in exclude_messages)
+            )
+
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        if record.levelno < self.min_level:
+            return None
+
+        program = record.program or record.name
+        if program in self.exclude:
+            return None
+
+        if self.include is not None and program not in self.include:
+            return None
+
+        if self.exclude_messages is not None and self.exclude_messages.match(
+            record.getMessage()
+        ):
+            return None
+
+        return record
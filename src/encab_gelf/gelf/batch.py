@@ -0,0 +1,70 @@
+#
+# Bulk delivery of GELF messages over HTTP
+#
+
+import time
+import zlib
+
+
+class GelfBatch(object):
+    def __init__(self, max_records=100, max_bytes=1048576, compress=True):
+        """
+        Collects packed GELF messages into one newline delimited request body.
+
+        If compress is set, messages are fed into a single zlib stream as they arrive,
+        so the body is compressed once instead of message by message.
+
+        :param max_records: maximum number of messages in a batch
+        :param max_bytes: maximum size of the uncompressed body
+        :param compress: compress the body or not
+        """
+
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._reset()
+
+    def _reset(self):
+        self.records = 0
+        self.size = 0
+        self.created = None
+        self._parts = []
+        self._compressor = zlib.compressobj() if self.compress else None
+
+    def __len__(self):
+        return self.records
+
+    def age(self):
+        return time.monotonic() - self.created if self.created is not None else 0.0
+
+    def fits(self, payload):
+        return self.records == 0 or self.size + len(payload) + 1 <= self.max_bytes
+
+    def is_full(self):
+        return self.records >= self.max_records or self.size >= self.max_bytes
+
+    def add(self, payload):
+        if self.records:
+            payload = b"\n" + payload
+        else:
+            self.created = time.monotonic()
+
+        self.records += 1
+        self.size += len(payload)
+        self._parts.append(
+            self._compressor.compress(payload) if self._compressor else payload
+        )
+
+    def take(self):
+        """
+        :return: the request body of all messages collected so far, or None if the batch is empty
+        """
+        if not self.records:
+            return None
+
+        parts = self._parts
+        if self._compressor:
+            parts.append(self._compressor.flush())
+
+        self._reset()
+        return b"".join(parts)
@@ -0,0 +1,105 @@
+#
+# JSON encoders for GELF messages
+#
+
+import json
+import math
+
+from enum import Enum
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None  # type: ignore
+
+JSON = "json"
+ORJSON = "orjson"
+AUTO = "auto"
+ENCODERS = (JSON, ORJSON, AUTO)
+
+
+def json_encoder(default):
+    """
+    :param default: function that is called for objects that cannot be serialized to JSON natively by python
+    :return: a function that encodes a message to UTF-8 JSON with the json module of the standard library
+    """
+
+    def encode(gelf):
+        return json.dumps(gelf, separators=(",", ":"), default=default).encode("utf-8")
+
+    return encode
+
+
+PLAIN_TYPES = frozenset((str, int, bool, type(None)))
+
+
+def needs_json(value):
+    """
+    :return: True if orjson would encode the value differently than the json module:
+             orjson encodes enums by value and NaN and infinity as null
+    """
+    kind = type(value)
+    if kind in PLAIN_TYPES:
+        return False
+    if kind is float:
+        return not math.isfinite(value)
+    if kind is dict or isinstance(value, dict):
+        # most fields are plain, so their check is inlined
+        for key, item in value.items():
+            kind = type(item)
+            if kind is float:
+                if not math.isfinite(item):
+                    return True
+            elif kind not in PLAIN_TYPES and needs_json(item):
+                return True
+            if type(key) is not str and needs_json(key):
+                return True
+        return False
+    if kind is list or kind is tuple or isinstance(value, (list, tuple)):
+        return any(needs_json(item) for item in value)
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    return isinstance(value, Enum)
+
+
+def orjson_encoder(default):
+    """
+    :param default: function that is called for objects that cannot be serialized to JSON natively by python
+    :return: a function that encodes a message to UTF-8 JSON with orjson
+    """
+    # objects that orjson would encode differently are passed to default, like the json module does
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+    fallback = json_encoder(default)
+
+    def encode(gelf):
+        if needs_json(gelf):
+            return fallback(gelf)
+        try:
+            return orjson.dumps(gelf, default=default, option=options)
+        except TypeError:
+            # e.g. integers with more than 64 bits, which only the json module supports
+            return fallback(gelf)
+
+    return encode
+
+
+def create(name, default):
+    """
+    :param name: ``json``, ``orjson`` or ``auto``, which selects orjson if it is installed
+    :param default: function that is called for objects that cannot be serialized to JSON natively by python
+    :return: a function that encodes a message to UTF-8 JSON
+    """
+    if name not in ENCODERS:
+        raise ValueError(f"Unsupported JSON encoder {name}")
+
+    if name == ORJSON and orjson is None:
+        raise ValueError("JSON encoder orjson is not installed")
+
+    if name == JSON or orjson is None:
+        return json_encoder(default)
+
+    return orjson_encoder(default)
@@ -0,0 +1,433 @@
+#
+# asyncio transport engine that runs all GELF outputs on one event loop
+#
+
+import asyncio
+
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from logging import Handler as LoggingHandler
+from threading import Thread, Lock
+
+from . import gelf
+from .batch import GelfBatch
+from .handlers import BaseHandler
+from .pool import check_status
+
+
+class Connection(object):
+    """per worker connection state of an output"""
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.transport = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.transport is not None:
+            self.transport.close()
+        self.reader = self.writer = self.transport = None
+
+
+class Output(ABC):
+    RETRY_DELAY = 1.0
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, host, port, buffer_size=1000, workers=1):
+        """
+        Base class of all outputs of the transport engine.
+
+        Messages are kept in a bounded write buffer until a worker task sends them.
+        If the buffer is full, the oldest message is dropped, so a slow output
+        never blocks the logging threads or the other outputs.
+
+        :param host: GELF input host
+        :param port: GELF input port
+        :param buffer_size: maximum number of messages waiting to be sent
+        :param workers: number of concurrent worker tasks, each with its own connection
+        """
+
+        self.host = host
+        self.port = port
+        self.buffer = deque()
+        self.buffer_size = buffer_size
+        self.workers = workers
+        self.sent = 0
+        # number of messages sent
+        self.dropped = 0
+        # number of messages dropped because the buffer was full
+        self.on_error = None
+        # function called with the exception if sending failed
+        self._busy = 0
+        self._tasks = []
+        self._ready = None
+        self._idle = None
+
+    async def start(self):
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [
+            asyncio.ensure_future(self._work(Connection())) for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def drained(self):
+        await self._idle.wait()
+
+    def push(self, data):
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(data)
+        self._idle.clear()
+        self._ready.set()
+
+    def take(self):
+        """removes the messages that are sent in one write from the buffer"""
+        return [self.buffer.popleft()]
+
+    @abstractmethod
+    async def write(self, connection, messages):
+        """sends the messages taken from the buffer over the connection"""
+
+    def failed(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+
+    async def _work(self, connection):
+        delay = self.RETRY_DELAY
+        try:
+            while True:
+                while not self.buffer:
+                    if not self._busy:
+                        self._idle.set()
+                    self._ready.clear()
+                    await self._ready.wait()
+
+                messages = self.take()
+                self._busy += 1
+                try:
+                    await self.write(connection, messages)
+                    self.sent += len(messages)
+                    delay = self.RETRY_DELAY
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    connection.close()
+                    self.failed(e)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                finally:
+                    self._busy -= 1
+        finally:
+            connection.close()
+
+
+class UdpOutput(Output):
+    def __init__(self, host, port, chunk_size=1300, buffer_size=1000):
+        """
+        :param chunk_size: length of a chunk, should be less than the MTU (maximum transmission unit)
+        """
+        Output.__init__(self, host, port, buffer_size)
+        self.chunk_size = chunk_size
+
+    def take(self):
+        # datagrams never block, so the whole buffer is sent at once
+        messages = list(self.buffer)
+        self.buffer.clear()
+        return messages
+
+    async def write(self, connection, messages):
+        if connection.transport is None:
+            loop = asyncio.get_running_loop()
+            connection.transport, _ = await loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=(self.host, self.port)
+            )
+
+        for data in messages:
+            if len(data) <= self.chunk_size:
+                connection.transport.sendto(data)
+                continue
+
+            try:
+                for header, chunk in gelf.split(data, self.chunk_size):
+                    connection.transport.sendto(b"".join((header, chunk)))
+            except gelf.MessageTooLarge as e:
+                # only this message is lost, the others are sent
+                self.failed(e)
+
+
+class TcpOutput(Output):
+    def __init__(self, host, port, ssl_context=None, buffer_size=1000, max_write=65536):
+        """
+        :param ssl_context: SSL context for TLS inputs, None for plain TCP
+        :param max_write: maximum number of bytes written at once
+        """
+        Output.__init__(self, host, port, buffer_size)
+        self.ssl_context = ssl_context
+        self.max_write = max_write
+
+    def take(self):
+        messages = [self.buffer.popleft()]
+        size = len(messages[0])
+        while self.buffer and size + len(self.buffer[0]) <= self.max_write:
+            data = self.buffer.popleft()
+            size += len(data)
+            messages.append(data)
+        return messages
+
+    async def write(self, connection, messages):
+        if connection.writer is not None and (
+            connection.writer.is_closing() or connection.reader.at_eof()
+        ):
+            connection.close()
+
+        if connection.writer is None:
+            connection.reader, connection.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl_context
+            )
+
+        # frames have to be null terminated or the input will reject them
+        connection.writer.write(b"".join(data + b"\x00" for data in messages))
+        await connection.writer.drain()
+
+
+class HttpOutput(Output):
+    def __init__(
+        self,
+        host,
+        port,
+        path="/gelf",
+        ssl_context=None,
+        compress=True,
+        timeout=5,
+        concurrency=2,
+        buffer_size=1000,
+        batch=False,
+        batch_max_records=100,
+        batch_max_bytes=1048576,
+    ):
+        """
+        :param path: path of the HTTP input
+        :param ssl_context: SSL context for HTTPS inputs, None for plain HTTP
+        :param compress: set the Content-Encoding header. If batch is set, the batch is compressed as a whole
+        :param timeout: amount of seconds to wait for a response
+        :param concurrency: maximum number of requests in flight, each on its own keep-alive connection
+        :param batch: send all waiting messages in one newline delimited request
+        :param batch_max_records: maximum number of messages per request
+        :param batch_max_bytes: maximum size of the uncompressed request body
+        """
+        Output.__init__(self, host, port, buffer_size, concurrency)
+        self.path = path
+        self.ssl_context = ssl_context
+        self.compress = compress
+        self.timeout = timeout
+        self.batch = batch
+        self.batch_max_records = batch_max_records
+        self.batch_max_bytes = batch_max_bytes
+
+        head = [
+            f"POST {path} HTTP/1.1",
+            f"Host: {host}:{port}",
+            "Content-Type: application/json",
+        ]
+        if compress:
+            head.append("Content-Encoding: gzip,deflate")
+        self.head = "\r\n".join(head).encode("latin-1")
+
+    def take(self):
+        if not self.batch:
+            return [self.buffer.popleft()]
+
+        batch = GelfBatch(self.batch_max_records, self.batch_max_bytes, self.compress)
+        while self.buffer and not batch.is_full() and batch.fits(self.buffer[0]):
+            batch.add(self.buffer.popleft())
+        return [batch.take()]
+
+    async def write(self, connection, messages):
+        body = messages[0]
+        reused = connection.writer is not None
+        try:
+            status = await asyncio.wait_for(
+                self.request(connection, body), self.timeout
+            )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if not reused:
+                raise
+            # the server closed the idle connection, retry once on a fresh one
+            connection.close()
+            status = await asyncio.wait_for(
+                self.request(connection, body), self.timeout
+            )
+        check_status(status)
+
+    async def request(self, connection, body):
+        if connection.writer is None:
+            connection.reader, connection.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl_context
+            )
+
+        reader, writer = connection.reader, connection.writer
+        writer.write(
+            b"%s\r\nContent-Length: %d\r\n\r\n%s" % (self.head, len(body), body)
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+
+        version, status = status_line.split(None, 2)[:2]
+        close = version == b"HTTP/1.0"
+        length = 0
+        chunked = False
+
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value
+            elif name == b"connection":
+                close = value == b"close"
+
+        # the response has to be consumed before the connection can be reused
+        if chunked:
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if not size:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                await reader.readexactly(size + 2)
+        elif length:
+            await reader.readexactly(length)
+
+        if close:
+            connection.close()
+
+        return int(status)
+
+
+class TransportEngine(object):
+    CLOSE_TIMEOUT = 5.0
+
+    def __init__(self):
+        """
+        Runs the outputs of all GELF handlers on a single asyncio event loop in a dedicated thread.
+        """
+
+        self.loop = asyncio.new_event_loop()
+        self.outputs = []
+        self.users = 0
+        self.closed = False
+        self.lock = Lock()
+        self.thread = Thread(target=self._run, name="gelf-engine", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _call(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def add(self, output):
+        self._call(output.start())
+        self.outputs.append(output)
+        return output
+
+    def submit(self, output, data):
+        if not self.closed:
+            self.loop.call_soon_threadsafe(output.push, data)
+
+    def acquire(self):
+        with self.lock:
+            self.users += 1
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+        self.close()
+
+    async def _drain(self):
+        await asyncio.gather(*(output.drained() for output in self.outputs))
+
+    async def _stop(self):
+        await asyncio.gather(*(output.stop() for output in self.outputs))
+
+    def flush(self, timeout=CLOSE_TIMEOUT):
+        """waits until all outputs have sent their messages"""
+        if self.closed:
+            return
+        try:
+            self._call(self._drain(), timeout)
+        except FutureTimeoutError:
+            pass
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            self.closed = True
+
+        try:
+            self._call(self._stop(), self.CLOSE_TIMEOUT)
+        except FutureTimeoutError:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(self.CLOSE_TIMEOUT)
+        if not self.thread.is_alive():
+            self.loop.close()
+
+
+class GelfEngineHandler(BaseHandler, LoggingHandler):
+
+    def __init__(self, engine, output, compress=False, **kwargs):
+        """
+        Logging handler that transforms each record into GELF (graylog extended log format)
+        and passes it to an output of the transport engine.
+
+        :param engine: the transport engine
+        :param output: the output of the engine the messages are sent to
+        :param compress: compress message before sending it to the server or not
+        """
+
+        LoggingHandler.__init__(self)
+        BaseHandler.__init__(self, compress=compress, **kwargs)
+
+        self.engine = engine
+        self.output = output
+        self.released = False
+        engine.acquire()
+
+    def emit(self, record):
+        self.send_gelf(self.convert_record_to_gelf(record))
+
+    def send_gelf(self, data):
+        self.engine.submit(self.output, data)
+
+    def flush(self):
+        self.engine.flush()
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.engine.release()
+        LoggingHandler.close(self)
@@ -7,8 +7,13 @@ import logging
 import json
 import zlib
 import os
-import struct
+import itertools
 import traceback
+import hashlib
+import time
+
+from collections import OrderedDict
+from threading import Lock
 
 
 LEVELS = {
@@ -59,6 +64,7 @@ def make(
     additional_fields,
     additional_env_fields,
     include_extra_fields=False,
+    projection=None,
 ):
     gelf = {
         "version": version,
@@ -67,9 +73,22 @@ def make(
         "level": LEVELS[record.levelno],
         "host": domain,
     }
+    add_record_fields(gelf, record, debug)
+
+    if additional_fields is not None:
+        gelf.update(additional_fields)
+
+    add_env_fields(gelf, additional_env_fields)
+
+    if include_extra_fields:
+        add_extra_fields(gelf, record, projection)
+
+    return gelf
+
 
+def add_record_fields(gelf, record, debug):
     if record.exc_info:
-        gelf["full_message"] = "\n".join(traceback.format_exception(*record.exc_info))
+        gelf["full_message"] = format_exception(record.exc_info)
     elif record.exc_text is not None:
         # QueueHandler, if used, formats the record, so that exc_info will always be empty:
         # https://docs.python.org/3/library/logging.handlers.html#logging.handlers.QueueHandler
@@ -82,9 +101,8 @@ def make(
         gelf["_func"] = record.funcName
         gelf["_logger_name"] = record.name
 
-    if additional_fields is not None:
-        gelf.update(additional_fields)
 
+def add_env_fields(gelf, additional_env_fields):
     if additional_env_fields is not None:
         appended = {}
         for name, env in additional_env_fields.items():
@@ -93,16 +111,244 @@ def make(
 
         gelf.update(appended)
 
-    if include_extra_fields:
-        add_extra_fields(gelf, record)
 
-    return gelf
+def exception_chain(exc):
+    """yields an exception and the exceptions it was caused by, as they are formatted"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        if exc.__cause__ is not None:
+            exc = exc.__cause__
+        elif exc.__context__ is not None and not exc.__suppress_context__:
+            exc = exc.__context__
+        else:
+            exc = None
+
+
+def frame_locations(tb):
+    locations = []
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        locations.append((code.co_filename, tb.tb_lineno, code.co_name))
+        tb = tb.tb_next
+    return tuple(locations)
+
+
+def fingerprint(exc_info):
+    """
+    :return: a short hash of the exception types and frame locations of exc_info,
+             equal for repetitions of the same error regardless of the exception messages
+    """
+    digest = hashlib.sha1()
+    for exc in exception_chain(exc_info[1]):
+        digest.update(type(exc).__qualname__.encode("utf-8"))
+        digest.update(repr(frame_locations(exc.__traceback__)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+# formatted tracebacks by exception type, message and frame locations
+_tracebacks: OrderedDict = OrderedDict()
+_tracebacks_lock = Lock()
+MAX_TRACEBACKS = 256
+
+
+def format_exception(exc_info):
+    """formats exc_info like traceback.format_exception, repeated tracebacks are taken from a cache"""
+    exc = exc_info[1]
+    if exc is None or hasattr(exc, "exceptions"):
+        # nothing to cache, exception groups are formatted as they are
+        return "\n".join(traceback.format_exception(*exc_info))
+
+    key = tuple(
+        (
+            type(exc),
+            str(exc),
+            tuple(getattr(exc, "__notes__", ())),
+            frame_locations(exc.__traceback__),
+        )
+        for exc in exception_chain(exc)
+    )
+
+    with _tracebacks_lock:
+        text = _tracebacks.get(key)
+        if text is not None:
+            _tracebacks.move_to_end(key)
+            return text
+
+    text = "\n".join(traceback.format_exception(*exc_info))
+
+    with _tracebacks_lock:
+        _tracebacks[key] = text
+        if len(_tracebacks) > MAX_TRACEBACKS:
+            _tracebacks.popitem(last=False)
+    return text
+
+
+class ExceptionDeduplicator(object):
+    MAX_FINGERPRINTS = 1024
+
+    def __init__(self, window):
+        """
+        Sends the full trace of an exception only once per time window.
+
+        Messages of repeated exceptions get the fingerprint and repeat count
+        instead of the full_message.
+
+        :param window: amount of seconds in which an exception is sent only once
+        """
+        self.window = window
+        self.fingerprints = {}
+        self.lock = Lock()
+
+    def repeated(self, fingerprint):
+        """:return: the number of repetitions since the full trace was sent, 0 if it has to be sent"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.fingerprints.get(fingerprint)
+            if entry is None or now - entry[0] >= self.window:
+                if len(self.fingerprints) >= self.MAX_FINGERPRINTS:
+                    self.fingerprints = {
+                        key: value
+                        for key, value in self.fingerprints.items()
+                        if now - value[0] < self.window
+                    }
+                self.fingerprints[fingerprint] = [now, 0]
+                return 0
+
+            entry[1] += 1
+            return entry[1]
+
+    def apply(self, gelf, record):
+        """adds the fingerprint of the exception of record and removes repeated traces"""
+        if not record.exc_info or record.exc_info[1] is None:
+            return
+
+        key = fingerprint(record.exc_info)
+        gelf["_exception_fingerprint"] = key
+
+        count = self.repeated(key)
+        if count:
+            gelf.pop("full_message", None)
+            gelf["_exception_repeat_count"] = count
 
 
-def add_extra_fields(gelf, record):
-    for key, value in record.__dict__.items():
-        if key not in SKIP_LIST and not key.startswith("_"):
-            gelf["_%s" % key] = value
+SKIP_SET = frozenset(SKIP_LIST)
+
+
+def add_extra_fields(gelf, record, projection=None):
+    if projection is None:
+        for key, value in record.__dict__.items():
+            if key not in SKIP_SET and not key.startswith("_"):
+                gelf["_%s" % key] = value
+        return
+
+    fields = dict(
+        (key, value)
+        for key, value in record.__dict__.items()
+        if key not in SKIP_SET and not key.startswith("_")
+    )
+    projected = {}
+    projection.project(projected, fields)
+    # the attributes of a record are always additional fields, whatever the projection renames them to
+    for name, value in projected.items():
+        gelf[name if name.startswith("_") else "_" + name] = value
+
+
+class Projection(object):
+    MAX_NAMES = 4096
+
+    def __init__(self, include=None, exclude=None, rename=None, prefix=False):
+        """
+        Maps the extra fields of a record to GELF additional fields.
+
+        The decision for a field name is made once and remembered,
+        so each field costs a single lookup.
+
+        :param include: names of the fields to keep, all fields if None
+        :param exclude: names of the fields to drop
+        :param rename: maps field names to GELF field names
+        :param prefix: add an underscore to field names that don't start with one
+        """
+        self.include = frozenset(include) if include is not None else None
+        self.exclude = frozenset(exclude or ())
+        self.rename = dict(rename or {})
+        self.prefix = prefix
+        self.names = {}
+
+    def target(self, name):
+        """:return: the GELF field name of a field or None if the field is dropped"""
+        if self.include is not None and name not in self.include:
+            return None
+        if name in self.exclude:
+            return None
+        if name in self.rename:
+            return self.rename[name]
+        if self.prefix and not name.startswith("_"):
+            return "_" + name
+        return name
+
+    def project(self, gelf, fields):
+        """adds the projected fields to gelf"""
+        names = self.names
+        for name, value in fields.items():
+            try:
+                target = names[name]
+            except KeyError:
+                target = self.target(name)
+                if len(names) < self.MAX_NAMES:
+                    names[name] = target
+            if target is not None:
+                gelf[target] = value
+
+
+class SizeBudget(object):
+    MARKER = "...[truncated]"
+
+    def __init__(
+        self, max_message_length=0, max_full_message_length=0, max_field_length=0
+    ):
+        """
+        Caps the length of the text fields of a message before it is encoded.
+
+        Truncated texts end with MARKER. A length of 0 means unlimited.
+
+        :param max_message_length: maximum length of short_message
+        :param max_full_message_length: maximum length of full_message
+        :param max_field_length: maximum length of the other text fields
+        """
+        self.max_message_length = max_message_length
+        self.max_full_message_length = max_full_message_length
+        self.max_field_length = max_field_length
+        self.truncated = 0
+        # number of truncated messages
+
+    def truncate(self, text, length):
+        if length and isinstance(text, str) and len(text) > length:
+            if length <= len(self.MARKER):
+                # no room for the marker
+                return text[:length]
+            return text[: length - len(self.MARKER)] + self.MARKER
+        return text
+
+    def apply(self, gelf):
+        """truncates the text fields of gelf in place"""
+        truncated = False
+        for name, value in gelf.items():
+            if name == "short_message":
+                length = self.max_message_length
+            elif name == "full_message":
+                length = self.max_full_message_length
+            else:
+                length = self.max_field_length
+
+            text = self.truncate(value, length)
+            if text is not value:
+                gelf[name] = text
+                truncated = True
+
+        if truncated:
+            self.truncated += 1
 
 
 def object_to_json(obj):
@@ -112,24 +358,86 @@ def object_to_json(obj):
     return str(obj)
 
 
-def pack(gelf, compress, default):
-    packed = json.dumps(gelf, separators=(",", ":"), default=default).encode("utf-8")
+def pack(gelf, compress, default, encode=None):
+    if encode is not None:
+        packed = encode(gelf)
+    else:
+        packed = json.dumps(gelf, separators=(",", ":"), default=default).encode(
+            "utf-8"
+        )
     return zlib.compress(packed) if compress else packed
 
 
+class Envelope(object):
+    def __init__(self, domain, version, static_fields, default, encode=None):
+        """
+        The constant part of the messages of a handler, encoded once.
+
+        :param domain: value of the host field
+        :param version: GELF version
+        :param static_fields: additional fields that are the same for all messages
+        :param default: function that is called for objects that cannot be serialized to JSON natively by python
+        :param encode: function that encodes the message fields to UTF-8 JSON, see encoders.create
+        """
+        static = {"version": version, "host": domain, **static_fields}
+        self.keys = frozenset(static)
+        self.default = default
+        self.encode = encode
+        self.tail = b"," + pack(static, False, default, encode)[1:]
+
+    def fits(self, gelf):
+        """
+        :return: True if gelf has none of the constant fields, so the envelope can be spliced in
+        """
+        return self.keys.isdisjoint(gelf)
+
+    def pack(self, gelf, compress):
+        """encodes the message fields and appends the constant ones"""
+        packed = pack(gelf, False, self.default, self.encode)
+        packed = b"".join((packed[:-1], self.tail))
+        return zlib.compress(packed) if compress else packed
+
+
+class MessageTooLarge(ValueError):
+    pass
+
+
+# chunked GELF messages start with these magic bytes
+CHUNK_MAGIC = b"\x1e\x0f"
+# Graylog drops messages with more chunks than that
+MAX_CHUNKS = 128
+
+# message ids only need to be unique per sender, so a counter with a random start is sufficient
+_message_ids = itertools.count(int.from_bytes(os.urandom(8), "big"))
+
+
+def next_message_id():
+    return (next(_message_ids) & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "big")
+
+
 def split(gelf, chunk_size):
-    header = b"\x1e\x0f"
-    message_id = os.urandom(8)
-    chunks = [gelf[pos : pos + chunk_size] for pos in range(0, len(gelf), chunk_size)]
-    number_of_chunks = len(chunks)
-
-    for chunk_index, chunk in enumerate(chunks):
-        yield b"".join(
-            (
-                header,
-                message_id,
-                struct.pack("b", chunk_index),
-                struct.pack("b", number_of_chunks),
-                chunk,
-            )
+    """
+    Splits a message into GELF chunks without copying it.
+
+    Yields a (header, chunk) pair per chunk. chunk is a memoryview slice of gelf.
+    The header buffer is reused for all chunks of a message,
+    so each pair must be sent before the next one is taken.
+
+    :raises MessageTooLarge: if the message needs more than 128 chunks
+    """
+    number_of_chunks = (len(gelf) + chunk_size - 1) // chunk_size
+    if number_of_chunks > MAX_CHUNKS:
+        raise MessageTooLarge(
+            f"GELF message of {len(gelf)} bytes exceeds {MAX_CHUNKS} chunks of {chunk_size} bytes"
         )
+
+    header = bytearray(12)
+    header[0:2] = CHUNK_MAGIC
+    header[2:10] = next_message_id()
+    header[11] = number_of_chunks
+
+    view = memoryview(gelf)
+    for chunk_index in range(number_of_chunks):
+        header[10] = chunk_index
+        pos = chunk_index * chunk_size
+        yield header, view[pos : pos + chunk_size]
@@ -8,7 +8,42 @@ import socket
 import http.client as httplib
 from logging.handlers import SocketHandler, DatagramHandler
 from logging import Handler as LoggingHandler
-from . import gelf
+from threading import Lock
+from . import gelf, encoders
+from .batch import GelfBatch
+from .pool import HttpConnectionPool, check_status
+from ..scheduler import shared_scheduler
+
+
+def create_ssl_context(validate=False, ca_certs=None, certfile=None, keyfile=None):
+    """
+    Creates the client side SSL context for the TLS and HTTPS outputs.
+
+    :param validate: if true, validate server certificate. In that case ca_certs are required
+    :param ca_certs: path to CA bundle file
+    :param certfile: path to the certificate file that is used to identify ourselves to the server
+    :param keyfile: path to the private key. If the private key is stored with the certificate,
+                    this parameter can be ignored
+    """
+
+    if validate and ca_certs is None:
+        raise ValueError("CA bundle file path must be specified")
+
+    if keyfile is not None and certfile is None:
+        raise ValueError("certfile must be specified")
+
+    ctx = ssl.create_default_context()
+
+    if not validate:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    else:
+        ctx.load_verify_locations(cafile=ca_certs)
+
+    if certfile is not None:
+        ctx.load_cert_chain(certfile, keyfile)
+
+    return ctx
 
 
 class BaseHandler(object):
@@ -21,14 +56,26 @@ class BaseHandler(object):
         static_fields=None,
         json_default=gelf.object_to_json,
         additional_env_fields=None,
+        json_encoder=encoders.JSON,
+        projection=None,
+        size_budget=None,
+        exception_window=0,
         **kwargs,
     ):
         """
         Logging handler that transforms each record into GELF (graylog extended log format) and sends it over TCP.
+        Subclasses add send_gelf, which sends the messages created by convert_record_to_gelf.
 
         :param debug: include debug fields, e.g. line number, or not
         :param include_extra_fields: include non-default fields from record to message, or not
         :param json_default: function that is called for objects that cannot be serialized to JSON natively by python
+        :param additional_env_fields: fields taken from environment variables, maps field names to variable names.
+                                      The variables are read once, call refresh_environment after they changed
+        :param json_encoder: JSON encoder: ``json``, ``orjson`` or ``auto``, which selects orjson if it is installed
+        :param projection: gelf.Projection that maps the extra fields of a record and, with include_extra_fields, its attributes, all are kept as they are if None
+        :param size_budget: gelf.SizeBudget that caps the length of the text fields, unlimited if None
+        :param exception_window: if greater than 0, the full trace of an exception is sent only once
+                                 in this amount of seconds, repetitions get its fingerprint and repeat count
         :param kwargs: additional fields that will be included in the log message, e.g. application name.
                        Each additional field should start with underscore, e.g. _app_name
         """
@@ -45,44 +92,189 @@ class BaseHandler(object):
         self.domain = socket.gethostname()
         self.compress = compress
         self.json_default = json_default
+        self.json_encode = encoders.create(json_encoder, json_default)
+        self.projection = projection
+        self.size_budget = size_budget
+        self.deduplicator = None
+        if exception_window > 0:
+            self.deduplicator = gelf.ExceptionDeduplicator(exception_window)
+        self.refresh_environment()
+
+    def refresh_environment(self):
+        """reads the environment variables of additional_env_fields again"""
+        env_fields = dict()
+        gelf.add_env_fields(env_fields, self.additional_env_fields)
+        envelope = gelf.Envelope(
+            self.domain,
+            self.version,
+            {**self.additional_fields, **env_fields},
+            self.json_default,
+            self.json_encode,
+        )
+        # a single assignment, so a concurrent convert never sees fields and envelope of different reads
+        self.environment = (env_fields, envelope)
+
+    def limit(self, message, record):
+        """removes repeated traces and truncates long texts"""
+        if self.deduplicator is not None:
+            self.deduplicator.apply(message, record)
+        if self.size_budget is not None:
+            self.size_budget.apply(message)
 
     def convert_record_to_gelf(self, record):
-        additional_fields = self.additional_fields or dict()
+        extra = None
         if hasattr(record, "extra") and isinstance(record.extra, dict):
-            additional_fields = {**additional_fields, **record.extra}
+            extra = record.extra
+        env_fields, envelope = self.environment
+
+        # only the fields of the record are encoded, the constant ones come from the envelope
+        fields = {
+            "short_message": record.getMessage(),
+            "timestamp": record.created,
+            "level": gelf.LEVELS[record.levelno],
+        }
+        gelf.add_record_fields(fields, record, self.debug)
+        if extra:
+            if self.projection is None:
+                fields.update(extra)
+            else:
+                self.projection.project(fields, extra)
+        if self.include_extra_fields:
+            gelf.add_extra_fields(fields, record, self.projection)
+
+        if envelope.fits(fields):
+            self.limit(fields, record)
+            return envelope.pack(fields, self.compress)
+
+        # a record field overrides a constant one, which the envelope can't represent
+        if extra and self.projection is not None:
+            projected = dict()
+            self.projection.project(projected, extra)
+            extra = projected
+
+        additional_fields = {
+            **self.additional_fields,
+            **(extra or {}),
+            **env_fields,
+        }
+
+        message = gelf.make(
+            record,
+            self.domain,
+            self.debug,
+            self.version,
+            additional_fields,
+            None,
+            self.include_extra_fields,
+            self.projection,
+        )
+        self.limit(message, record)
 
         return gelf.pack(
-            gelf.make(
-                record,
-                self.domain,
-                self.debug,
-                self.version,
-                additional_fields,
-                self.additional_env_fields,
-                self.include_extra_fields,
-            ),
+            message,
             self.compress,
             self.json_default,
+            self.json_encode,
         )
 
 
 class GelfTcpHandler(BaseHandler, SocketHandler):
 
-    def __init__(self, host, port, **kwargs):
+    def __init__(self, host, port, write_buffer_size=0, write_linger=0.05, **kwargs):
         """
         Logging handler that transforms each record into GELF (graylog extended log format) and sends it over TCP.
+        Subclasses add send_gelf, which sends the messages created by convert_record_to_gelf.
 
         :param host: GELF TCP input host
         :param port: GELF TCP input port
+        :param write_buffer_size: if greater than 0, messages are collected and written at once
+                                  when this many bytes are buffered or write_linger has passed
+        :param write_linger: maximum amount of seconds a message waits in the write buffer
         """
 
         SocketHandler.__init__(self, host, port)
         BaseHandler.__init__(self, **kwargs)
 
+        self.write_buffer_size = write_buffer_size
+        self.write_buffer = bytearray()
+        self.write_lock = Lock()
+        self.write_linger = write_linger
+        self.write_deadline = None
+
     def makePickle(self, record):
         """if you send the message over tcp, it should always be null terminated or the input will reject it"""
         return self.convert_record_to_gelf(record) + b"\x00"
 
+    def emit(self, record):
+        try:
+            self.send(self.makePickle(record))
+        except OSError:
+            # like SocketHandler, records are dropped while the input is unreachable
+            pass
+        except Exception:
+            self.handleError(record)
+
+    def send_gelf(self, data):
+        self.send(data + b"\x00")
+
+    def write(self, data):
+        """
+        writes to the socket, connecting first if necessary
+
+        Unlike SocketHandler.send, errors are raised, so a caller can keep the data.
+        While SocketHandler waits to retry a failed connect, ConnectionError is raised.
+        """
+        if self.sock is None:
+            self.createSocket()
+        if self.sock is None:
+            raise ConnectionError(f"Not connected to {self.host}:{self.port}")
+
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            raise
+
+    def send(self, s):
+        if self.write_buffer_size <= 0:
+            self.write(s)
+            return
+
+        with self.write_lock:
+            self.write_buffer += s
+            if len(self.write_buffer) >= self.write_buffer_size:
+                self.writeBuffer()
+            elif self.write_deadline is None:
+                self.write_deadline = shared_scheduler().schedule(
+                    self.write_linger, self.flushExpired
+                )
+
+    def writeBuffer(self):
+        if self.write_deadline is not None:
+            self.write_deadline.cancel()
+            self.write_deadline = None
+        if self.write_buffer:
+            data = bytes(self.write_buffer)
+            self.write_buffer.clear()
+            self.write(data)
+
+    def flush(self):
+        if self.write_buffer_size > 0:
+            with self.write_lock:
+                self.writeBuffer()
+
+    def flushExpired(self):
+        try:
+            self.flush()
+        except OSError:
+            # the buffered messages are dropped, like SocketHandler does
+            pass
+
+    def close(self):
+        self.flushExpired()
+        SocketHandler.close(self)
+
 
 class GelfUdpHandler(BaseHandler, DatagramHandler):
 
@@ -90,7 +282,7 @@ class GelfUdpHandler(BaseHandler, DatagramHandler):
         """
         Logging handler that transforms each record into GELF (graylog extended log format) and sends it over UDP.
         If message length exceeds chunk_size, the message splits into multiple chunks.
-        The number of chunks must be less than 128.
+        Messages that need more than 128 chunks are rejected with MessageTooLarge.
 
         :param host: GELF UDP input host
         :param port: GELF UDP input port
@@ -103,18 +295,65 @@ class GelfUdpHandler(BaseHandler, DatagramHandler):
 
         self.chunk_size = chunk_size
 
+    def makeSocket(self):
+        # a connected socket resolves the host name once instead of on every sendto
+        sock = DatagramHandler.makeSocket(self)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
     def send(self, s):
+        if self.sock is None:
+            self.sock = self.makeSocket()
+
+        try:
+            self.sendDatagrams(s)
+        except ConnectionRefusedError:
+            # the refusal of an earlier datagram is reported once, by the next send,
+            # which is dropped. Sending again lets the next send report it too,
+            # so every send fails while the input is down
+            try:
+                self.sendDatagrams(s)
+            except OSError:
+                pass
+            raise
+        except OSError:
+            # reconnect next time, the address of the input may have changed
+            self.sock.close()
+            self.sock = None
+            raise
+
+    def sendDatagrams(self, s):
         if len(s) <= self.chunk_size:
-            DatagramHandler.send(self, s)
+            self.sock.send(s)
             return
 
-        chunks = gelf.split(s, self.chunk_size)
-        for chunk in chunks:
-            DatagramHandler.send(self, chunk)
+        sendmsg = getattr(self.sock, "sendmsg", None)
+        for header, chunk in gelf.split(s, self.chunk_size):
+            if sendmsg is not None:
+                # scatter/gather I/O sends header and chunk without joining them
+                sendmsg((header, chunk))
+            else:
+                self.sock.send(bytes(header) + chunk)
+
+    def emit(self, record):
+        try:
+            self.send(self.makePickle(record))
+        except OSError:
+            # an unreachable input doesn't fail logging, like sendto on an unconnected socket
+            pass
+        except Exception:
+            self.handleError(record)
 
     def makePickle(self, record):
         return self.convert_record_to_gelf(record)
 
+    def send_gelf(self, data):
+        self.send(data)
+
 
 class GelfTlsHandler(GelfTcpHandler):
 
@@ -129,10 +368,11 @@ class GelfTlsHandler(GelfTcpHandler):
         **kwargs,
     ):
         """
-        TCP GELF logging handler with TLS support
+        TCP GELF logging handler with TLS support.
+        Reconnects resume the previous TLS session if the server supports it.
 
-        :param host: GELF UDP input host
-        :param port: GELF UDP input port
+        :param host: GELF TLS input host
+        :param port: GELF TLS input port
         :param validate: if true, validate server certificate. In that case ca_certs are required
         :param ca_certs: path to CA bundle file. For instance, on CentOS it would be '/etc/pki/tls/certs/ca-bundle.crt'
         :param certfile: path to the certificate file that is used to identify ourselves to the server
@@ -140,40 +380,84 @@ class GelfTlsHandler(GelfTcpHandler):
                         this parameter can be ignored
         """
 
-        if validate and ca_certs is None:
-            raise ValueError("CA bundle file path must be specified")
-
-        if keyfile is not None and certfile is None:
-            raise ValueError("certfile must be specified")
+        # the context is created once and reused for all reconnects
+        self.ctx = create_ssl_context(validate, ca_certs, certfile, keyfile)
 
         GelfTcpHandler.__init__(self, host, port, **kwargs)
 
         self.ca_certs = ca_certs
-        self.reqs = ssl.CERT_REQUIRED if validate else ssl.CERT_NONE
+        self.reqs = self.ctx.verify_mode
         self.certfile = certfile
         self.keyfile = keyfile if keyfile else certfile
+        self.session = None
+        # TLS session of the last connection, used to resume the session on reconnect
+        self.session_pending = False
+        # True until a resumable session was received from the server
+        self.resumed = 0
+        # number of connections that resumed a session
 
     def makeSocket(self, timeout=1):
-        plain_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        if hasattr(plain_socket, "settimeout"):
-            plain_socket.settimeout(timeout)
+        plain_socket = socket.create_connection((self.host, self.port), timeout)
 
-        wrapped_socket = ssl.wrap_socket(
-            plain_socket,
-            ca_certs=self.ca_certs,
-            cert_reqs=self.reqs,
-            keyfile=self.keyfile,
-            certfile=self.certfile,
-        )
-        wrapped_socket.connect((self.host, self.port))
+        try:
+            wrapped_socket = self.ctx.wrap_socket(
+                plain_socket, server_hostname=self.host, session=self.session
+            )
+        except BaseException:
+            plain_socket.close()
+            raise
+
+        if wrapped_socket.session_reused:
+            self.resumed += 1
+        else:
+            self.session_pending = True
+            self.updateSession(wrapped_socket)
 
         return wrapped_socket
 
+    def updateSession(self, sock):
+        """
+        TLS 1.3 servers send session tickets after the handshake.
+        They are processed when the socket is read, so poll the socket without blocking.
+        """
+        timeout = sock.gettimeout()
+        try:
+            sock.settimeout(0)
+            sock.recv(1)
+        except (ssl.SSLWantReadError, BlockingIOError):
+            pass
+        except OSError:
+            return
+        finally:
+            sock.settimeout(timeout)
+
+        session = sock.session
+        if session is not None and (session.has_ticket or sock.version() != "TLSv1.3"):
+            self.session = session
+            self.session_pending = False
+
+    def write(self, data):
+        GelfTcpHandler.write(self, data)
+        if self.session_pending and self.sock is not None:
+            self.updateSession(self.sock)
+
 
 class GelfHttpHandler(BaseHandler, LoggingHandler):
 
-    def __init__(self, host, port, compress=True, path="/gelf", timeout=5, **kwargs):
+    def __init__(
+        self,
+        host,
+        port,
+        compress=True,
+        path="/gelf",
+        timeout=5,
+        pool_size=2,
+        batch=False,
+        batch_max_records=100,
+        batch_max_bytes=1048576,
+        batch_max_age=1.0,
+        **kwargs,
+    ):
         """
         Logging handler that transforms each record into GELF (graylog extended log format) and sends it over HTTP.
 
@@ -183,32 +467,107 @@ class GelfHttpHandler(BaseHandler, LoggingHandler):
         :param path: path of the HTTP input (http://docs.graylog.org/en/latest/pages/sending_data.html#gelf-via-http)
         :param timeout: amount of seconds that HTTP client should wait before it discards the request
                         if the server doesn't respond
+        :param pool_size: maximum number of idle keep-alive connections kept open
+        :param batch: send messages in newline delimited batches. The GELF HTTP input must have bulk receiving enabled
+        :param batch_max_records: maximum number of messages per batch
+        :param batch_max_bytes: maximum size of the uncompressed batch in bytes
+        :param batch_max_age: maximum amount of seconds a message waits in a batch before it is sent
         """
 
         LoggingHandler.__init__(self)
-        BaseHandler.__init__(self, compress=compress, **kwargs)
+        # batches are compressed as a whole
+        BaseHandler.__init__(self, compress=compress and not batch, **kwargs)
 
         self.host = host
         self.port = port
         self.path = path
         self.timeout = timeout
         self.headers = {}
+        self.pool = HttpConnectionPool(self.makeConnection, pool_size)
+
+        self.batch = None
+        self.batch_lock = Lock()
+        self.batch_error = None
+        self.batch_max_age = batch_max_age
+        self.batch_deadline = None
+        if batch:
+            self.batch = GelfBatch(batch_max_records, batch_max_bytes, compress)
 
         if compress:
             self.headers["Content-Encoding"] = "gzip,deflate"
 
-    def emit(self, record):
-        data = self.convert_record_to_gelf(record)
-        connection = httplib.HTTPConnection(
+    def makeConnection(self):
+        return httplib.HTTPConnection(
             host=self.host, port=self.port, timeout=self.timeout
         )
+
+    def post(self, data):
+        check_status(self.pool.request("POST", self.path, data, self.headers))
+
+    def emit(self, record):
+        self.send_gelf(self.convert_record_to_gelf(record))
+
+    def send_gelf(self, data):
+        if self.batch is None:
+            self.post(data)
+            return
+
+        bodies = []
+        with self.batch_lock:
+            if not self.batch.fits(data):
+                bodies.append(self.batch.take())
+            self.batch.add(data)
+            if self.batch.is_full():
+                bodies.append(self.batch.take())
+            if len(self.batch) == 0:
+                self.cancelDeadline()
+            elif self.batch_deadline is None:
+                self.batch_deadline = shared_scheduler().schedule(
+                    self.batch_max_age, self.flushExpired
+                )
+            error, self.batch_error = self.batch_error, None
+
+        for body in bodies:
+            self.post(body)
+
+        if error:
+            # errors of timed flushes are reported to the caller of the next emit
+            raise error
+
+    def flush(self):
+        if self.batch is None:
+            return
+
+        with self.batch_lock:
+            body = self.batch.take()
+            self.cancelDeadline()
+
+        if body is not None:
+            self.post(body)
+
+    def cancelDeadline(self):
+        if self.batch_deadline is not None:
+            self.batch_deadline.cancel()
+            self.batch_deadline = None
+
+    def flushExpired(self):
         try:
-            connection.request("POST", self.path, data, self.headers)
+            self.flush()
+        except Exception as e:
+            self.batch_error = e
+
+    def close(self):
+        try:
+            if self.batch is not None:
+                self.flush()
+        except (httplib.HTTPException, OSError):
+            pass
         finally:
-            connection.close()
+            self.pool.close()
+            LoggingHandler.close(self)
 
 
-class GelfHttpsHandler(BaseHandler, LoggingHandler):
+class GelfHttpsHandler(GelfHttpHandler):
 
     def __init__(
         self,
@@ -222,10 +581,11 @@ class GelfHttpsHandler(BaseHandler, LoggingHandler):
         certfile=None,
         keyfile=None,
         keyfile_password=None,
+        pool_size=2,
         **kwargs,
     ):
         """
-        Logging handler that transforms each record into GELF (graylog extended log format) and sends it over HTTP.
+        Logging handler that transforms each record into GELF (graylog extended log format) and sends it over HTTPS.
 
         :param host: GELF HTTP input host
         :param port: GELF HTTP input port
@@ -238,44 +598,31 @@ class GelfHttpsHandler(BaseHandler, LoggingHandler):
         :param certfile: not yet used
         :param keyfile: not yet used
         :param keyfile_password: not yet used
+        :param pool_size: maximum number of idle keep-alive connections kept open
+
+        See GelfHttpHandler for the batch parameters.
         """
 
-        LoggingHandler.__init__(self)
-        BaseHandler.__init__(self, compress=compress, **kwargs)
+        GelfHttpHandler.__init__(
+            self,
+            host,
+            port,
+            compress=compress,
+            path=path,
+            timeout=timeout,
+            pool_size=pool_size,
+            **kwargs,
+        )
 
-        self.host = host
-        self.port = port
-        self.path = path
-        self.timeout = timeout
-        self.headers = {}
         self.ca_certs = ca_certs
         self.keyfile = keyfile
         self.certfile = certfile
         self.keyfile_password = keyfile_password
 
         # Set up context: https://docs.python.org/3/library/http.client.html#http.client.HTTPSConnection
-        # create_default_context returns an SSLContext object
-        self.ctx = ssl.create_default_context()
-
-        if validate and ca_certs is None:
-            raise ValueError("CA bundle file path must be specified")
-
-        if not validate:
-            self.ctx.check_hostname = False
-            self.ctx.verify_mode = ssl.CERT_NONE
-        else:
-            # Load our CA file
-            self.ctx.load_verify_locations(cafile=self.ca_certs)
+        self.ctx = create_ssl_context(validate, ca_certs)
 
-        if compress:
-            self.headers["Content-Encoding"] = "gzip,deflate"
-
-    def emit(self, record):
-        data = self.convert_record_to_gelf(record)
-        connection = httplib.HTTPSConnection(
+    def makeConnection(self):
+        return httplib.HTTPSConnection(
             host=self.host, port=self.port, context=self.ctx, timeout=self.timeout
         )
-        try:
-            connection.request("POST", self.path, data, self.headers)
-        finally:
-            connection.close()
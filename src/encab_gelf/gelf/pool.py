@@ -0,0 +1,121 @@
+#
+# Keep-alive HTTP/1.1 connection pool for the GELF HTTP and HTTPS handlers
+#
+
+import http.client as httplib
+
+from collections import deque
+from threading import Lock
+
+# errors raised when a pooled connection was closed by the server while it was idle
+STALE_CONNECTION_ERRORS = (
+    httplib.RemoteDisconnected,
+    httplib.ImproperConnectionState,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class HttpStatusError(httplib.HTTPException):
+    def __init__(self, status):
+        """
+        The GELF HTTP input responded with a status other than 2xx.
+
+        :param status: the HTTP status code
+        """
+        super().__init__(f"GELF HTTP input responded with status {status}")
+        self.status = status
+
+    @property
+    def rejected(self):
+        """True if the input rejected the message itself, so sending it again doesn't help"""
+        return 400 <= self.status < 500 and self.status not in (408, 429)
+
+
+def check_status(status):
+    """raises HttpStatusError unless status is a 2xx status"""
+    if not 200 <= status < 300:
+        raise HttpStatusError(status)
+
+
+class HttpConnectionPool(object):
+    def __init__(self, factory, maxsize=2):
+        """
+        Pool of persistent HTTP/1.1 connections to a single GELF HTTP input.
+
+        Connections are reused as long as the server keeps them open.
+        Responses are read completely so that the next request can be sent over the same connection.
+        If a reused connection turns out to be stale, the request is retried once on a fresh connection.
+
+        :param factory: function without arguments that returns a new ``HTTPConnection`` or ``HTTPSConnection``
+        :param maxsize: maximum number of idle connections kept open
+        """
+
+        self.factory = factory
+        self.maxsize = maxsize
+        self.hits = 0
+        # number of requests that were sent over a reused connection
+        self.misses = 0
+        # number of requests that required a new connection
+        self.reconnects = 0
+        # number of stale connections that were reopened
+        self._idle = deque()
+        self._lock = Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop(), True
+            self.misses += 1
+        return self.factory(), False
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    @staticmethod
+    def _send(connection, method, path, body, headers):
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        # the response has to be consumed before the connection can be reused
+        response.read()
+        return response
+
+    def request(self, method, path, body, headers):
+        """
+        Sends a request and discards the response.
+
+        :return: the HTTP status code of the response
+        """
+        connection, reused = self._acquire()
+        try:
+            try:
+                response = self._send(connection, method, path, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                connection.close()
+                self.reconnects += 1
+                response = self._send(connection, method, path, body, headers)
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        return response.status
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+
+        for connection in idle:
+            connection.close()
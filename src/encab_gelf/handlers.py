@@ -1,9 +1,28 @@
-from typing import Dict, Any, List, Optional
+from typing import (
+    Dict,
+    Any,
+    List,
+    Optional,
+    Callable,
+    Protocol,
+    runtime_checkable,
+    Tuple,
+    TypeVar,
+    Pattern,
+    Union,
+    cast,
+)
 
 from logging import LogRecord, getLogger, Handler, DEBUG
 from http.client import HTTPException
-
-from .one_shot_timer import OneShotTimer
+from queue import Queue, Full, Empty
+from threading import Thread
+from functools import partial
+
+from .scheduler import Scheduler, Deadline, shared_scheduler
+from .spool import Spool
+from .circuit_breaker import CircuitBreaker
+from .gelf.pool import HttpStatusError
 from .log_line_recognizer import LogLineRecognizer, DefaultRecognizer
 
 from socket import error as SocketError
@@ -14,20 +33,15 @@ ENCAB_GELF = "encab_gelf"
 mylogger = getLogger(__name__)
 mylogger.setLevel(DEBUG)
 
+T = TypeVar("T")
+
+CONNECTION_ERRORS = (HTTPException, ConnectionError, SocketError)
+
 
 class ExtLogRecord(LogRecord):
     def __init__(self, record: LogRecord) -> None:
-        super().__init__(
-            record.name,
-            record.levelno,
-            record.pathname,
-            record.lineno,
-            record.msg,
-            record.args,
-            record.exc_info,
-            record.funcName,
-            record.stack_info,
-        )
+        # a copy of the attributes, LogRecord.__init__ would query time, process and thread again
+        self.__dict__.update(record.__dict__)
         self.is_log_record = True
         self.extra: Dict[str, Any] = (
             record.extra
@@ -53,73 +67,340 @@ class ExtLogRecord(LogRecord):
         return msg
 
 
-class MultiLineHandler(Handler):
-    TIMEOUT: float = 0.5
+class LineStream(object):
+    def __init__(self) -> None:
+        """The block of lines a logger writes on one thread."""
+        self.first: Optional[ExtLogRecord] = None
+        self.lines: List[str] = list()
+        self.backlog_bytes: int = 0
+        self.generation: int = 0
+        # incremented with each block, so a deadline of an earlier block is ignored
+        self.deadline: Optional[Deadline] = None
+
+    def begin(self, record: ExtLogRecord) -> None:
+        message = record.getMessage()
+        self.first = record
+        self.lines = [message]
+        self.backlog_bytes = len(message)
+        self.generation += 1
+
+    def append(self, message: str) -> None:
+        self.lines.append(message)
+        self.backlog_bytes += len(message) + 1
+
+    def take(self) -> Optional[ExtLogRecord]:
+        """:return: the first record with the joined message of the block, None if it is empty"""
+        if self.deadline is not None:
+            self.deadline.cancel()
+            self.deadline = None
+
+        first_record = self.first
+        if first_record is not None and len(self.lines) > 1:
+            first_record.msg = "\n".join(self.lines)
+            first_record.args = None
+        self.first = None
+        self.lines = list()
+        self.backlog_bytes = 0
+        return first_record
+
+
+class Stage(object):
+    def __init__(self) -> None:
+        """
+        A step of a pipeline.
+
+        process returns the record that is passed to the next stage, or None if the record
+        was dropped or is kept by the stage. Kept records are passed on later with forward.
+        """
+        self.pipeline: Optional["Pipeline"] = None
+        self.index: int = 0
+
+    def bind(self, pipeline: "Pipeline", index: int) -> None:
+        self.pipeline = pipeline
+        self.index = index
+
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        return record
 
-    def __init__(
-        self, name: str, handler: Handler, timeout: Optional[float] = None
-    ) -> None:
-        super().__init__(handler.level)
-        self.name = name
-        self.handler = handler
-        self.backlog: List[LogRecord] = list()
-        self.timer = OneShotTimer(timeout or self.TIMEOUT, self.flush)
+    def forward(self, record: ExtLogRecord) -> None:
+        """passes a record to the next stage"""
+        assert self.pipeline
+        self.pipeline.run(record, self.index + 1)
+
+    def acquire(self) -> None:
+        assert self.pipeline
+        self.pipeline.acquire()
 
-    def emit_upstream(self, record: LogRecord):
-        self.handler.emit(record)
+    def release(self) -> None:
+        assert self.pipeline
+        self.pipeline.release()
 
-    def emitAll(self, record: LogRecord):
-        self.timer.clear()
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
         self.flush()
-        self.emit_upstream(record)
 
-    def emit(self, log_record: LogRecord) -> None:
-        record = ExtLogRecord.fromRecord(log_record)
 
-        if not self.backlog:
-            self.backlog.append(record)
-            self.timer.start()
-            return
+class Pipeline(Handler):
+    def __init__(self, name: str, stages: List[Stage], output: Handler) -> None:
+        """
+        Runs log records through a list of stages in a single emit and passes them on to the output.
 
-        first_record = self.backlog[0]
+        The stages share the lock of the pipeline and are called directly,
+        so a stage costs a method call instead of a nested handler.
 
-        if (
-            first_record.name == record.name
-            and first_record.levelno == record.levelno
-            and first_record.thread == record.thread
-            and not first_record.args
-            and not record.is_log_record
-        ):
-            self.backlog.append(record)
-        else:
-            return self.emitAll(record)
+        :param name: name of the handler in the settings
+        :param stages: the stages in the order they are run
+        :param output: the handler the records are sent to after the last stage
+        """
+        super().__init__(output.level)
+        self.name = name
+        self.stages = stages
+        self.output = output
+        for index, stage in enumerate(stages):
+            stage.bind(self, index)
+
+    def run(self, record: ExtLogRecord, start: int = 0) -> None:
+        """runs the record through the stages, beginning with the stage at index start"""
+        stages = self.stages
+        for index in range(start, len(stages)):
+            result = stages[index].process(record)
+            if result is None:
+                return
+            record = result
+
+        self.output.emit(record)
+
+    def emit(self, log_record: LogRecord) -> None:
+        self.run(ExtLogRecord.fromRecord(log_record))
 
     def flush(self):
-        if self.backlog:
-            first_record = self.backlog[0]
-            lines = [first_record.getMessage()]
-            for record in self.backlog[1:]:
-                lines.append(record.getMessage())
-            first_record.msg = "\n".join(lines)
-            self.emit_upstream(first_record)
-            self.backlog = list()
+        for stage in self.stages:
+            stage.flush()
+        self.output.flush()
 
     def close(self):
-        self.timer.close()
-        self.flush()
+        for stage in self.stages:
+            stage.close()
+        self.output.close()
+        super().close()
+
+    def refresh_environment(self) -> None:
+        """reads the environment fields of the GELF handlers again"""
+        refresh = getattr(self.output, "refresh_environment", None)
+        if refresh is not None:
+            refresh()
+
+
+class MultiLineStage(Stage):
+    TIMEOUT: float = 0.5
+    MAX_LINES: int = 1000
+    MAX_BYTES: int = 1048576
+    MAX_STREAMS: int = 64
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_lines: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        scheduler: Optional[Scheduler] = None,
+        recognizer: Optional[LogLineRecognizer] = None,
+        continuation: Optional[Pattern[str]] = None,
+        early_flush: bool = False,
+    ) -> None:
+        """
+        Joins continuation lines with the log line they belong to.
+
+        Each logger and thread has its own block of lines, so interleaved output
+        of several programs is joined correctly.
+        Only the first record of a block is kept, continuation lines are kept as message fragments.
+        A block is sent if a line that doesn't belong to it arrives, after the timeout,
+        or as soon as it reaches one of the limits.
+        Records that cannot have continuation lines, e.g. records with arguments
+        or an exception, are sent at once.
+
+        If a continuation pattern is set, a line is a continuation line if it matches the pattern
+        and the recognizer doesn't recognize it as a log line. Otherwise is_log_record of the record decides.
+        With early flush, a line that is not a continuation line is sent at once
+        instead of waiting for continuation lines, which are then sent as a block of their own.
+
+        :param timeout: maximum amount of seconds a line waits for continuation lines
+        :param max_lines: maximum number of lines in a block
+        :param max_bytes: maximum number of characters in a block
+        :param scheduler: sends blocks after the timeout, the shared scheduler by default
+        :param recognizer: recognizes log lines that match the continuation pattern
+        :param continuation: pattern of continuation lines, e.g. leading whitespace
+        :param early_flush: send log lines at once instead of waiting for continuation lines
+        """
+        super().__init__()
+        self.timeout = timeout or self.TIMEOUT
+        self.max_lines = max_lines or self.MAX_LINES
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        self.scheduler = scheduler or shared_scheduler()
+        self.recognizer = recognizer
+        self.continuation = continuation
+        self.early_flush = early_flush
+        self.streams: Dict[Tuple[str, Optional[int]], LineStream] = dict()
+
+    @property
+    def backlog_lines(self) -> int:
+        """number of lines waiting to be sent"""
+        return sum(len(stream.lines) for stream in list(self.streams.values()))
+
+    @property
+    def backlog_bytes(self) -> int:
+        """number of characters waiting to be sent"""
+        return sum(stream.backlog_bytes for stream in list(self.streams.values()))
+
+    def stream(self, record: ExtLogRecord) -> LineStream:
+        key = (record.name, record.thread)
+        stream = self.streams.get(key)
+        if stream is not None:
+            return stream
+
+        if len(self.streams) >= self.MAX_STREAMS:
+            # the stream of a thread that is gone is never used again
+            oldest_key = next(iter(self.streams))
+            self.flushStream(self.streams.pop(oldest_key))
+
+        stream = LineStream()
+        self.streams[key] = stream
+        return stream
+
+    def isContinuation(self, record: ExtLogRecord) -> bool:
+        if self.continuation is None:
+            return not record.is_log_record
+
+        message = record.getMessage()
+        if self.continuation.match(message) is None:
+            return False
+
+        # a log line that matches the pattern anyway, e.g. an indented one, starts a new block
+        return (
+            self.recognizer is None or self.recognizer.recognize(message).level is None
+        )
+
+    def isComplete(self, record: ExtLogRecord) -> bool:
+        """:return: True if no line can be joined with the record"""
+        return bool(record.args or record.exc_info or record.is_from_encab)
+
+    def begin(self, stream: LineStream, record: ExtLogRecord) -> None:
+        stream.begin(record)
+        stream.deadline = self.scheduler.schedule(
+            self.timeout, self.expire, stream, stream.generation
+        )
+
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        stream = self.stream(record)
+        first_record = stream.first
+
+        if self.isComplete(record):
+            self.flushStream(stream)
+            return record
+
+        if first_record is None:
+            if self.early_flush and not self.isContinuation(record):
+                return record
+            self.begin(stream, record)
+            return None
+
+        if first_record.levelno == record.levelno and self.isContinuation(record):
+            message = record.getMessage()
+            if (
+                len(stream.lines) >= self.max_lines
+                or stream.backlog_bytes + len(message) + 1 > self.max_bytes
+            ):
+                # a runaway block is sent in parts
+                self.flushStream(stream)
+                self.begin(stream, record)
+                return None
+
+            stream.append(message)
+            return None
+
+        # the line ends the block and, unless sent early, begins the next one
+        self.flushStream(stream)
+        if self.early_flush:
+            return record
+        self.begin(stream, record)
+        return None
+
+    def expire(self, stream: LineStream, generation: int) -> None:
+        # a worker of the scheduler flushes concurrently to emit, which is called with the lock held
+        self.acquire()
+        try:
+            if stream.generation == generation:
+                self.flushStream(stream)
+        finally:
+            self.release()
+
+    def flushStream(self, stream: LineStream) -> None:
+        self.acquire()
+        try:
+            record = stream.take()
+            if record is not None:
+                self.forward(record)
+        finally:
+            self.release()
+
+    def flush(self) -> None:
+        for stream in list(self.streams.values()):
+            self.flushStream(stream)
+
 
+class MultiLineHandler(Pipeline):
+    TIMEOUT: float = MultiLineStage.TIMEOUT
 
-class RecognizingHandler(Handler):
     def __init__(
         self,
+        name: str,
         handler: Handler,
-        handler_name: str,
+        timeout: Optional[float] = None,
+        max_lines: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        scheduler: Optional[Scheduler] = None,
         recognizer: Optional[LogLineRecognizer] = None,
+        continuation: Optional[Pattern[str]] = None,
+        early_flush: bool = False,
     ) -> None:
-        super().__init__(handler.level)
+        """
+        Handler that joins continuation lines with the log line they belong to, see MultiLineStage.
+
+        :param name: name of the handler in the settings
+        :param handler: the handler the joined records are sent to
+        """
+        self.stage = MultiLineStage(
+            timeout,
+            max_lines,
+            max_bytes,
+            scheduler,
+            recognizer,
+            continuation,
+            early_flush,
+        )
+        super().__init__(name, [self.stage], handler)
+
+    @property
+    def backlog_lines(self) -> int:
+        """number of lines waiting to be sent"""
+        return self.stage.backlog_lines
+
+    @property
+    def backlog_bytes(self) -> int:
+        """number of characters waiting to be sent"""
+        return self.stage.backlog_bytes
+
+
+class RecognizingStage(Stage):
+    def __init__(self, recognizer: Optional[LogLineRecognizer] = None) -> None:
+        """
+        Sets level and attributes of records from the log line, e.g. ``ERROR failed``.
+
+        :param recognizer: the log line recognizer, the default recognizer if not set
+        """
+        super().__init__()
         self.recognizer = recognizer or DefaultRecognizer()
-        self.handler = handler
-        self.handler_name: str = handler_name
 
     def recognize(self, record: ExtLogRecord) -> ExtLogRecord:
         log_line = self.recognizer.recognize(record.getMessage())
@@ -132,37 +413,59 @@ class RecognizingHandler(Handler):
 
         record.levelno = log_line.level.value
         record.levelname = log_line.level.name
-        record.extra = {**record.extra, **log_line.attrs}
+        if log_line.attrs:
+            # the extra dict may be shared with other handlers, so it is not updated in place
+            record.extra = (
+                {**record.extra, **log_line.attrs} if record.extra else log_line.attrs
+            )
         return record
 
-    def emit(self, log_record: LogRecord) -> None:
-        record = ExtLogRecord.fromRecord(log_record)
-
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
         if record.args or record.suppress or record.is_from_encab:
-            return self.handler.emit(record)
+            return record
 
-        self.handler.emit(self.recognize(record))
+        return self.recognize(record)
 
 
-class ErrorHandler(Handler):
-    def __init__(self, handler: Handler, handler_name: str, host_url: str) -> None:
-        super().__init__(handler.level)
+class RecognizingHandler(Pipeline):
+    def __init__(
+        self,
+        handler: Handler,
+        handler_name: str,
+        recognizer: Optional[LogLineRecognizer] = None,
+    ) -> None:
+        self.stage = RecognizingStage(recognizer)
+        super().__init__(handler_name, [self.stage], handler)
         self.handler = handler
-        self.errors: int = 0
         self.handler_name: str = handler_name
-        self.host_url = host_url
+        self.recognizer = self.stage.recognizer
 
-    def emit(self, log_record: LogRecord) -> None:
-        record = ExtLogRecord.fromRecord(log_record)
+    def recognize(self, record: ExtLogRecord) -> ExtLogRecord:
+        return self.stage.recognize(record)
 
-        if record.suppress:
-            return
 
-        try:
-            self.handler.emit(record)
-            if self.errors:
-                self.errors = 0
-        except (HTTPException, ConnectionError, SocketError) as e:
+@runtime_checkable
+class GelfSender(Protocol):
+    def convert_record_to_gelf(self, record: LogRecord) -> bytes: ...
+
+    def send_gelf(self, data: bytes) -> None: ...
+
+
+class ErrorReporter(object):
+    def __init__(self, handler_name: str, host_url: str) -> None:
+        """
+        Reports errors of sending to a Graylog input to the encab_gelf logger.
+
+        :param handler_name: name of the handler in the settings
+        :param host_url: URL of the Graylog input
+        """
+        self.errors: int = 0
+        self.handler_name = handler_name
+        self.host_url = host_url
+
+    def report(self, e: Exception) -> None:
+        """reports an error of sending to the input"""
+        if isinstance(e, CONNECTION_ERRORS):
             if not self.errors:
                 mylogger.warning(
                     "GELF Handler %s failed to connect to %s: %s",
@@ -173,11 +476,351 @@ class ErrorHandler(Handler):
                 )
             else:
                 self.errors = (self.errors + 1) % 100
-        except Exception as e:
-            mylogger.exception(
+        else:
+            mylogger.error(
                 "GELF Handler %s connecting to %s: %s",
                 self.handler_name,
                 self.host_url,
                 str(e),
+                exc_info=e,
+                extra={"program": ENCAB_GELF, "suppress": True},
+            )
+
+    def succeeded(self) -> None:
+        """resets the count of connection errors after sending succeeded"""
+        if self.errors:
+            self.errors = 0
+
+
+class ErrorHandler(Handler):
+    def __init__(
+        self,
+        handler: Handler,
+        handler_name: str,
+        host_url: str,
+        spool: Optional[Spool] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """
+        Reports errors of a GELF handler.
+
+        :param handler: the GELF handler
+        :param handler_name: name of the handler in the settings
+        :param host_url: URL of the Graylog input
+        :param spool: keeps log records that could not be sent. If set, the handler
+            has to be a GelfSender
+        :param breaker: stops sending while the server is unreachable
+        """
+        super().__init__(handler.level)
+        self.handler = handler
+        self.sender: Optional[GelfSender] = (
+            handler if isinstance(handler, GelfSender) else None
+        )
+        # emit of the logging handlers reports errors to stderr instead of raising them,
+        # so records of GELF handlers are sent with send_gelf
+        self.reporter = ErrorReporter(handler_name, host_url)
+        self.handler_name: str = handler_name
+        self.host_url = host_url
+        self.spool = spool
+        self.breaker = breaker
+        self.short_circuited: int = 0
+        # number of records not sent because the circuit breaker was open
+
+    def report(self, e: Exception) -> None:
+        """reports an error of the wrapped handler"""
+        self.reporter.report(e)
+
+    def call(self, function: Callable[..., T], *args: Any) -> Optional[T]:
+        """
+        calls a function of the wrapped handler and reports errors
+
+        :return: the result of the function or None if it failed
+        """
+        try:
+            result = function(*args)
+            self.reporter.succeeded()
+            return result
+        except Exception as e:
+            self.report(e)
+        return None
+
+    def deliver(self, function: Callable[..., Any], *args: Any) -> bool:
+        """
+        calls a function of the wrapped handler that sends to the server,
+        unless the circuit breaker is open, and reports errors
+
+        :return: False if the server was unreachable, so the data should be kept.
+            Data the server can't accept, e.g. a message that is too large, is reported and dropped
+        """
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow():
+            self.short_circuited += 1
+            return False
+
+        try:
+            function(*args)
+        except Exception as e:
+            self.report(e)
+            if not self.unreachable(e):
+                # the server was reached, the record itself is faulty
+                if breaker is not None:
+                    breaker.succeeded()
+                return True
+
+            if breaker is not None and breaker.failed():
+                mylogger.warning(
+                    "GELF Handler %s stops sending to %s for up to %.1f seconds",
+                    self.handler_name,
+                    self.host_url,
+                    breaker.delay,
+                    extra={"program": ENCAB_GELF, "suppress": True},
+                )
+            return False
+
+        self.reporter.succeeded()
+        if breaker is not None:
+            breaker.succeeded()
+        return True
+
+    def unreachable(self, e: Exception) -> bool:
+        """:return: True if the error means that the server couldn't be reached"""
+        if isinstance(e, HttpStatusError):
+            return not e.rejected
+        return isinstance(e, CONNECTION_ERRORS)
+
+    def sendSpooled(self, sender: "GelfSender", data: bytes) -> None:
+        """sends a spooled record, a faulty one is reported and dropped so it doesn't block the spool"""
+        try:
+            sender.send_gelf(data)
+        except Exception as e:
+            if self.unreachable(e):
+                raise
+            self.report(e)
+
+    def replay(self, sender: "GelfSender") -> bool:
+        """
+        sends the spooled records
+
+        :return: True if the spool is empty
+        """
+        assert self.spool is not None
+        if not self.deliver(self.spool.replay, partial(self.sendSpooled, sender)):
+            return False
+
+        mylogger.info(
+            "GELF Handler %s sent spooled records to %s",
+            self.handler_name,
+            self.host_url,
+            extra={"program": ENCAB_GELF, "suppress": True},
+        )
+        return True
+
+    def convert(self, record: LogRecord) -> Optional[bytes]:
+        """serializes a record and reports errors"""
+        sender = cast(GelfSender, self.handler)
+        return self.call(sender.convert_record_to_gelf, record)
+
+    def send(self, data: bytes) -> None:
+        """sends a serialized record, spools it if the server is unreachable"""
+        sender = cast(GelfSender, self.handler)
+
+        if self.spool is None:
+            self.deliver(sender.send_gelf, data)
+            return
+
+        # keep the order of the records: the spooled ones are sent first
+        if self.spool and not self.replay(sender):
+            self.spool.append(data)
+            return
+
+        if not self.deliver(sender.send_gelf, data):
+            self.spool.append(data)
+
+    def emit(self, log_record: LogRecord) -> None:
+        record = ExtLogRecord.fromRecord(log_record)
+
+        if record.suppress:
+            return
+
+        if self.sender is None:
+            self.deliver(self.handler.emit, record)
+            return
+
+        data = self.convert(record)
+        if data is not None:
+            self.send(data)
+
+    def flush(self) -> None:
+        self.call(self.handler.flush)
+
+    def close(self) -> None:
+        self.call(self.handler.close)
+        super().close()
+
+    def refresh_environment(self) -> None:
+        """reads the environment fields of the GELF handler again"""
+        refresh = getattr(self.handler, "refresh_environment", None)
+        if refresh is not None:
+            refresh()
+
+
+class AsyncHandler(Handler):
+    BLOCK = "block"
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+    OVERFLOW_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST)
+
+    CLOSE_TIMEOUT: float = 5.0
+
+    def __init__(
+        self,
+        handler: GelfSender,
+        error_handler: ErrorHandler,
+        queue_size: int = 1000,
+        overflow: str = BLOCK,
+    ) -> None:
+        """
+        Serializes records on the caller's thread and sends them from a background thread.
+
+        :param handler: the GELF handler
+        :param error_handler: reports errors of the GELF handler
+        :param queue_size: maximum number of serialized records waiting to be sent
+        :param overflow: what to do if the queue is full: ``block``, ``drop_newest`` or ``drop_oldest``
+        """
+        super().__init__(error_handler.level)
+        assert overflow in self.OVERFLOW_POLICIES
+        self.handler = handler
+        self.error_handler = error_handler
+        self.overflow = overflow
+        self.dropped: int = 0
+        self.queue: Queue[Optional[bytes]] = Queue(queue_size)
+        self.thread = Thread(
+            target=self.run,
+            name=f"gelf-{error_handler.handler_name}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            data = self.queue.get()
+            try:
+                if data is None:
+                    return
+                self.error_handler.send(data)
+            finally:
+                self.queue.task_done()
+
+    def drop(self) -> None:
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            mylogger.warning(
+                "GELF Handler %s queue is full, %d records dropped so far",
+                self.error_handler.handler_name,
+                self.dropped,
                 extra={"program": ENCAB_GELF, "suppress": True},
             )
+
+    def enqueue(self, data: bytes) -> None:
+        if self.overflow == self.BLOCK:
+            self.queue.put(data)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(data)
+                return
+            except Full:
+                if self.overflow == self.DROP_NEWEST:
+                    self.drop()
+                    return
+
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.drop()
+            except Empty:
+                pass
+
+    def convert(self, record: LogRecord) -> Optional[bytes]:
+        """serializes a record and reports errors"""
+        return self.error_handler.call(self.handler.convert_record_to_gelf, record)
+
+    def send(self, data: bytes) -> None:
+        """queues a serialized record"""
+        self.enqueue(data)
+
+    def emit(self, log_record: LogRecord) -> None:
+        record = ExtLogRecord.fromRecord(log_record)
+
+        if record.suppress:
+            return
+
+        data = self.convert(record)
+        if data is not None:
+            self.enqueue(data)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """waits until all queued records are sent, then flushes the GELF handler"""
+        with self.queue.all_tasks_done:
+            self.queue.all_tasks_done.wait_for(
+                lambda: not self.queue.unfinished_tasks,
+                timeout if timeout is not None else self.CLOSE_TIMEOUT,
+            )
+        self.error_handler.flush()
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=self.CLOSE_TIMEOUT)
+                self.thread.join(self.CLOSE_TIMEOUT)
+            except Full:
+                pass
+        self.error_handler.close()
+        super().close()
+
+    def refresh_environment(self) -> None:
+        """reads the environment fields of the GELF handler again"""
+        self.error_handler.refresh_environment()
+
+
+class FanOutHandler(Handler):
+    def __init__(self, outputs: List[Union[ErrorHandler, AsyncHandler]]) -> None:
+        """
+        Serializes each record once and sends it to several outputs.
+
+        All outputs must produce the same GELF payload for a record,
+        i.e. use the same optional fields and compression.
+
+        :param outputs: the outputs, the first one serializes the records
+        """
+        assert outputs
+        super().__init__(outputs[0].level)
+        self.outputs = outputs
+
+    def emit(self, log_record: LogRecord) -> None:
+        record = ExtLogRecord.fromRecord(log_record)
+
+        if record.suppress:
+            return
+
+        data = self.outputs[0].convert(record)
+        if data is None:
+            return
+
+        for output in self.outputs:
+            output.send(data)
+
+    def flush(self) -> None:
+        for output in self.outputs:
+            output.flush()
+
+    def close(self) -> None:
+        for output in self.outputs:
+            output.close()
+        super().close()
+
+    def refresh_environment(self) -> None:
+        """reads the environment fields of the GELF handlers again"""
+        for output in self.outputs:
+            output.refresh_environment()
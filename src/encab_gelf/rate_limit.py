@@ -0,0 +1,132 @@
+from typing import Dict, Optional, Tuple
+from logging import LogRecord, WARNING
+
+import time
+
+from .handlers import Stage, ExtLogRecord
+from .scheduler import Scheduler, Deadline, shared_scheduler
+
+
+class TokenBucket(object):
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        """
+        Allows rate calls per second on average and up to burst calls at once.
+
+        :param rate: number of tokens added per second
+        :param burst: maximum number of tokens
+        :param now: current time in seconds, e.g. time.monotonic()
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        """:return: True if a token was available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimitStage(Stage):
+    MAX_BUCKETS: int = 1024
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 0,
+        levels: Optional[Dict[str, float]] = None,
+        summary_interval: float = 60.0,
+        scheduler: Optional[Scheduler] = None,
+    ) -> None:
+        """
+        Limits the number of log records per program and level with token buckets.
+
+        Records above the limit are dropped. Once per summary interval, a warning
+        with the number of dropped records is sent for each program that was limited.
+
+        :param rate: records per second and program, 0 - unlimited
+        :param burst: number of records a program may send at once, rate if lower
+        :param levels: records per second by level name, e.g. ``{"DEBUG": 10}``, overrides rate. 0 - unlimited
+        :param summary_interval: seconds between summaries of dropped records
+        :param scheduler: sends the summaries, the shared scheduler by default
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.levels = {name.upper(): rate for name, rate in (levels or {}).items()}
+        self.summary_interval = summary_interval
+        self.scheduler = scheduler or shared_scheduler()
+        self.buckets: Dict[Tuple[str, int], TokenBucket] = dict()
+        self.suppressed: Dict[str, int] = dict()
+        # number of dropped records per program since the last summary
+        self.summary: Optional[Deadline] = None
+
+    def bucket(self, key: Tuple[str, int], rate: float, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            return bucket
+
+        if len(self.buckets) >= self.MAX_BUCKETS:
+            # the buckets of loggers that are gone are never used again
+            del self.buckets[next(iter(self.buckets))]
+
+        bucket = TokenBucket(rate, max(self.burst, rate, 1), now)
+        self.buckets[key] = bucket
+        return bucket
+
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        if record.is_from_encab:
+            return record
+
+        rate = self.levels.get(record.levelname, self.rate)
+        if rate <= 0:
+            return record
+
+        program = record.program or record.name
+        now = time.monotonic()
+        if self.bucket((program, record.levelno), rate, now).take(now):
+            return record
+
+        self.suppressed[program] = self.suppressed.get(program, 0) + 1
+        if self.summary is None:
+            self.summary = self.scheduler.schedule(
+                self.summary_interval, self.summarize
+            )
+        return None
+
+    def summaryRecord(self, program: str, count: int) -> ExtLogRecord:
+        record = ExtLogRecord(
+            LogRecord(
+                program,
+                WARNING,
+                __file__,
+                0,
+                f"Rate limit exceeded: {count} log lines of {program} were dropped",
+                None,
+                None,
+            )
+        )
+        record.program = program
+        record.extra = {"program": program, "_suppressed_lines": count}
+        return record
+
+    def summarize(self) -> None:
+        self.acquire()
+        try:
+            suppressed, self.suppressed = self.suppressed, dict()
+            self.summary = None
+            for program, count in suppressed.items():
+                self.forward(self.summaryRecord(program, count))
+        finally:
+            self.release()
+
+    def flush(self) -> None:
+        if self.summary is not None:
+            self.summary.cancel()
+            self.summarize()
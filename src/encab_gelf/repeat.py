@@ -0,0 +1,102 @@
+from typing import Dict, Optional, Tuple
+
+import re
+
+from .handlers import Stage, ExtLogRecord
+from .scheduler import Scheduler, Deadline, shared_scheduler
+
+NUMBERS = re.compile(r"\d+")
+
+
+class Repetition(object):
+    __slots__ = ("first", "last", "count", "deadline")
+
+    def __init__(self, first: float) -> None:
+        """The repetitions of a log message in a window."""
+        self.first = first
+        # time stamp of the first occurrence
+        self.last: Optional[ExtLogRecord] = None
+        # the latest repetition, which becomes the summary
+        self.count: int = 0
+        self.deadline: Optional[Deadline] = None
+
+
+class RepeatStage(Stage):
+    MAX_MESSAGES: int = 1024
+
+    def __init__(self, window: float, scheduler: Optional[Scheduler] = None) -> None:
+        """
+        Collapses repeated log messages of a program, e.g. of a crash loop.
+
+        The first occurrence of a message is passed on at once. Repetitions in the
+        following window seconds are dropped, and at the end of the window a single record
+        with the fields ``_repeat_count``, ``_first_timestamp`` and ``_last_timestamp`` is sent.
+        Messages are compared with numbers removed, so counters and ids don't tell them apart.
+
+        :param window: seconds repetitions of a message are collapsed
+        :param scheduler: ends the windows, the shared scheduler by default
+        """
+        super().__init__()
+        self.window = window
+        self.scheduler = scheduler or shared_scheduler()
+        self.repetitions: Dict[Tuple[str, int, str], Repetition] = dict()
+
+    def key(self, record: ExtLogRecord) -> Tuple[str, int, str]:
+        program = record.program or record.name
+        return (program, record.levelno, NUMBERS.sub("0", record.getMessage()))
+
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        if record.exc_info or record.is_from_encab:
+            # exceptions are collapsed by the GELF handlers, see exception_window
+            return record
+
+        key = self.key(record)
+        repetition = self.repetitions.get(key)
+        if repetition is not None:
+            repetition.count += 1
+            repetition.last = record
+            return None
+
+        if len(self.repetitions) >= self.MAX_MESSAGES:
+            self.end(next(iter(self.repetitions)))
+
+        repetition = Repetition(record.created)
+        repetition.deadline = self.scheduler.schedule(
+            self.window, self.expire, key, repetition
+        )
+        self.repetitions[key] = repetition
+        return record
+
+    def end(self, key: Tuple[str, int, str]) -> None:
+        """ends the window of a message and sends the summary of its repetitions"""
+        repetition = self.repetitions.pop(key)
+        if repetition.deadline is not None:
+            repetition.deadline.cancel()
+
+        record = repetition.last
+        if record is None:
+            return
+
+        record.extra = {
+            **record.extra,
+            "_repeat_count": repetition.count,
+            "_first_timestamp": repetition.first,
+            "_last_timestamp": record.created,
+        }
+        self.forward(record)
+
+    def expire(self, key: Tuple[str, int, str], repetition: Repetition) -> None:
+        self.acquire()
+        try:
+            if self.repetitions.get(key) is repetition:
+                self.end(key)
+        finally:
+            self.release()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            for key in list(self.repetitions):
+                self.end(key)
+        finally:
+            self.release()
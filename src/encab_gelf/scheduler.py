@@ -0,0 +1,151 @@
+from typing import Any, Callable, Deque, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Condition, Lock
+from logging import getLogger, DEBUG
+
+import time
+
+from .config import ENCAB_GELF
+
+mylogger = getLogger(__name__)
+mylogger.setLevel(DEBUG)
+
+
+class Deadline(object):
+    __slots__ = ("due", "callback", "args", "cancelled")
+
+    def __init__(self, due: float, callback: Callable[..., Any], args: tuple) -> None:
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """the callback won't be called unless it is already due"""
+        self.cancelled = True
+
+
+class Scheduler(object):
+    WORKERS: int = 4
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        """
+        Calls functions after a delay.
+
+        Deadlines are kept in one FIFO queue per delay. As all deadlines in a queue
+        have the same delay, they are due in the order they were scheduled,
+        so scheduling and cancelling a deadline take constant time.
+        Cancelled deadlines are removed when they reach the head of their queue.
+
+        A single thread waits for the deadlines and hands the due functions to a pool of
+        worker threads. Scheduled functions may block on network I/O, e.g. to send a batch,
+        so a slow Graylog input only delays other deadlines once all workers are busy.
+        Functions that block must be bounded by a timeout.
+
+        :param workers: maximum number of functions called at the same time
+        """
+        self.queues: Dict[float, Deque[Deadline]] = dict()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or self.WORKERS, thread_name_prefix="gelf-worker"
+        )
+        self.condition = Condition(Lock())
+        self.thread: Optional[Thread] = None
+        self.closed = False
+
+    def schedule(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> Deadline:
+        """
+        calls callback with args after delay seconds
+
+        :return: the deadline, which can be cancelled
+        """
+        deadline = Deadline(time.monotonic() + delay, callback, args)
+        with self.condition:
+            queue = self.queues.get(delay)
+            if queue is None:
+                queue = self.queues[delay] = deque()
+
+            queue.append(deadline)
+            if len(queue) == 1:
+                # the new deadline may be due before all others
+                self.condition.notify()
+
+            if self.thread is None:
+                self.thread = Thread(
+                    target=self.run, name="gelf-scheduler", daemon=True
+                )
+                self.thread.start()
+        return deadline
+
+    def next(self) -> Optional[Deadline]:
+        """:return: the deadline that is due first"""
+        first: Optional[Deadline] = None
+        for delay, queue in list(self.queues.items()):
+            while queue and queue[0].cancelled:
+                queue.popleft()
+            if not queue:
+                del self.queues[delay]
+            elif first is None or queue[0].due < first.due:
+                first = queue[0]
+        return first
+
+    def take(self) -> Optional[Deadline]:
+        """waits for the next deadline, None if the scheduler was closed"""
+        with self.condition:
+            while not self.closed:
+                deadline = self.next()
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+
+                delay = deadline.due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                for queue in self.queues.values():
+                    if queue and queue[0] is deadline:
+                        queue.popleft()
+                        break
+                return deadline
+        return None
+
+    def run(self) -> None:
+        while True:
+            deadline = self.take()
+            if deadline is None:
+                return
+
+            self.executor.submit(self.call, deadline)
+
+    def call(self, deadline: Deadline) -> None:
+        try:
+            deadline.callback(*deadline.args)
+        except Exception as e:
+            mylogger.error(
+                "Scheduled function failed: %s",
+                str(e),
+                exc_info=e,
+                extra={"program": ENCAB_GELF, "suppress": True},
+            )
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.executor.shutdown(wait=False)
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = Lock()
+
+
+def shared_scheduler() -> Scheduler:
+    """:return: the scheduler shared by all handlers of the process"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.closed:
+            _scheduler = Scheduler()
+        return _scheduler
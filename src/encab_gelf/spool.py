@@ -0,0 +1,142 @@
+import os
+import mmap
+import struct
+
+from typing import Callable, Deque, Optional, BinaryIO
+from collections import deque
+from threading import Lock
+
+RECORD_HEADER = struct.Struct(">I")
+SEGMENT_SUFFIX = ".spool"
+
+
+class Segment(object):
+    def __init__(self, path: str, size: int = 0) -> None:
+        self.path = path
+        self.size = size
+
+
+class Spool(object):
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 67108864,
+        segment_bytes: int = 4194304,
+    ) -> None:
+        """
+        Keeps packed GELF messages on disk while the Graylog server is unreachable.
+
+        Messages are appended to length prefixed segment files. Replayed segments are
+        memory mapped and deleted once all of their messages are sent. If the spool
+        grows beyond max_bytes, the oldest segments are deleted first.
+        Segments left over by a previous run are replayed as well.
+
+        :param directory: directory of the segment files, created if missing
+        :param max_bytes: maximum size of all segment files
+        :param segment_bytes: size of a segment file at which a new one is started
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.size: int = 0
+        # size of all segment files
+        self.evicted: int = 0
+        # number of bytes deleted because the spool was full
+        self.lock = Lock()
+        self.segments: Deque[Segment] = deque()
+        self.writer: Optional[BinaryIO] = None
+        self.offset: int = 0
+        # read position in the oldest segment
+        self.sequence: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                sequence = int(name[: -len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue  # not a segment file of the spool
+            path = os.path.join(directory, name)
+            segment = Segment(path, os.path.getsize(path))
+            self.segments.append(segment)
+            self.size += segment.size
+            self.sequence = sequence + 1
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def closeWriter(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def openWriter(self) -> BinaryIO:
+        self.closeWriter()
+        path = os.path.join(self.directory, f"{self.sequence:012d}{SEGMENT_SUFFIX}")
+        self.sequence += 1
+        self.segments.append(Segment(path))
+        self.writer = open(path, "ab")
+        return self.writer
+
+    def evict(self) -> None:
+        segment = self.segments.popleft()
+        if not self.segments:
+            self.closeWriter()
+        os.remove(segment.path)
+        self.size -= segment.size
+        self.evicted += segment.size - self.offset
+        self.offset = 0
+
+    def append(self, data: bytes) -> None:
+        """stores a message at the end of the spool"""
+        length = RECORD_HEADER.size + len(data)
+        with self.lock:
+            writer = self.writer
+            if writer is None or self.segments[-1].size + length > self.segment_bytes:
+                writer = self.openWriter()
+
+            writer.write(RECORD_HEADER.pack(len(data)))
+            writer.write(data)
+            writer.flush()
+            self.segments[-1].size += length
+            self.size += length
+
+            while self.size > self.max_bytes and self.segments:
+                self.evict()
+
+    def replay(self, send: Callable[[bytes], None]) -> int:
+        """
+        sends all spooled messages, oldest first
+
+        If send raises an exception, replay stops and the exception is passed on.
+        The message that failed and all later ones stay in the spool.
+
+        :return: the number of messages sent
+        """
+        count = 0
+        with self.lock:
+            self.closeWriter()
+            while self.segments:
+                segment = self.segments[0]
+                with open(segment.path, "rb") as file:
+                    if segment.size > self.offset:
+                        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                            while self.offset + RECORD_HEADER.size <= len(m):
+                                start = self.offset + RECORD_HEADER.size
+                                (length,) = RECORD_HEADER.unpack_from(m, self.offset)
+                                if start + length > len(m):
+                                    break  # incomplete message of an interrupted run
+                                send(m[start : start + length])
+                                self.offset = start + length
+                                count += 1
+
+                self.segments.popleft()
+                os.remove(segment.path)
+                self.size -= segment.size
+                self.offset = 0
+        return count
+
+    def close(self) -> None:
+        with self.lock:
+            self.closeWriter()
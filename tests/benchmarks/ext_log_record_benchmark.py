@@ -0,0 +1,75 @@
+#
+# Compares copying a log record by running LogRecord.__init__ again
+# with copying its attributes, alone and in the handler chain
+# (multi-line handler, recognizing handler), in time and allocated memory.
+#
+# usage: python tests/benchmarks/ext_log_record_benchmark.py
+#
+
+import timeit
+import tracemalloc
+
+from logging import Handler, LogRecord, INFO
+
+from encab_gelf.handlers import ExtLogRecord, MultiLineHandler, RecognizingHandler
+
+ROUNDS = 50000
+
+
+class NullHandler(Handler):
+    def emit(self, record):
+        pass
+
+
+def legacy_copy(record):
+    copy = ExtLogRecord.__new__(ExtLogRecord)
+    LogRecord.__init__(
+        copy,
+        record.name,
+        record.levelno,
+        record.pathname,
+        record.lineno,
+        record.msg,
+        record.args,
+        record.exc_info,
+        record.funcName,
+        record.stack_info,
+    )
+    copy.is_log_record = True
+    copy.extra = {}
+    copy.suppress = False
+    copy.program = None
+    copy.is_from_encab = False
+    return copy
+
+
+def allocated(function):
+    tracemalloc.start()
+    function()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    record = LogRecord("program", INFO, __file__, 0, "INFO Message", None, None)
+    record.extra = {"program": "program"}
+    chain = MultiLineHandler(
+        "benchmark", RecognizingHandler(NullHandler(), "benchmark")
+    )
+
+    for name, function in (
+        ("LogRecord.__init__", lambda: legacy_copy(record)),
+        ("fromRecord", lambda: ExtLogRecord.fromRecord(record)),
+        ("chain", lambda: chain.handle(record)),
+    ):
+        seconds = timeit.timeit(function, number=ROUNDS)
+        print(
+            f"{name:24} {seconds / ROUNDS * 1e6:8.2f} us/record"
+            f" {allocated(function):8} bytes/record"
+        )
+    chain.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#
+# Compares converting a record by encoding all GELF fields
+# with splicing in the precompiled envelope of the handler.
+#
+# usage: python tests/benchmarks/gelf_envelope_benchmark.py
+#
+
+import timeit
+
+from logging import LogRecord, INFO
+
+from encab_gelf.gelf import gelf
+from encab_gelf.gelf.handlers import BaseHandler
+
+ROUNDS = 100000
+
+OPTIONAL_FIELDS = {
+    "_application": "encab",
+    "_environment": "production",
+    "_datacenter": "eu-central-1",
+    "_team": "platform",
+    "_version": "1.4.2",
+}
+
+
+def legacy_convert(handler, record):
+    additional_fields = {**handler.additional_fields, **record.extra}
+    return gelf.pack(
+        gelf.make(
+            record,
+            handler.domain,
+            handler.debug,
+            handler.version,
+            additional_fields,
+            handler.additional_env_fields,
+            handler.include_extra_fields,
+        ),
+        handler.compress,
+        handler.json_default,
+    )
+
+
+def main():
+    record = LogRecord(
+        "program", INFO, "program.py", 1, "GET /index.html 200", None, None
+    )
+    record.extra = {"_status": 200}
+
+    for compress in (False, True):
+        handler = BaseHandler(compress=compress, **OPTIONAL_FIELDS)
+        for name, convert in (
+            ("legacy", lambda: legacy_convert(handler, record)),
+            ("envelope", lambda: handler.convert_record_to_gelf(record)),
+        ):
+            seconds = timeit.timeit(convert, number=ROUNDS)
+            label = f"{name} {'compressed' if compress else 'plain'}"
+            print(f"{label:24} {seconds / ROUNDS * 1e6:8.2f} us/record")
+
+
+if __name__ == "__main__":
+    main()
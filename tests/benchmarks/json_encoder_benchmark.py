@@ -0,0 +1,40 @@
+#
+# Compares the JSON encoders of GELF messages.
+#
+# usage: python tests/benchmarks/json_encoder_benchmark.py
+#
+
+import datetime
+import timeit
+
+from encab_gelf.gelf import encoders
+from encab_gelf.gelf.gelf import object_to_json
+
+ROUNDS = 100000
+
+MESSAGE = {
+    "short_message": "GET /index.html 200",
+    "timestamp": 1700000000.123456,
+    "level": 6,
+    "_status": 200,
+    "_path": "/index.html",
+    "_duration": 0.0123,
+    "_started": datetime.datetime(2024, 1, 2, 3, 4, 5),
+}
+
+
+def main():
+    names = [encoders.JSON]
+    if encoders.orjson is not None:
+        names.append(encoders.ORJSON)
+    else:
+        print("orjson is not installed, install it with: pip install orjson")
+
+    for name in names:
+        encode = encoders.create(name, object_to_json)
+        seconds = timeit.timeit(lambda: encode(MESSAGE), number=ROUNDS)
+        print(f"{name:24} {seconds / ROUNDS * 1e6:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
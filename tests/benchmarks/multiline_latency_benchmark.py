@@ -0,0 +1,58 @@
+#
+# Measures the time from logging a single line until the multi-line handler
+# passes it on, waiting for continuation lines or with early flush.
+#
+# usage: python tests/benchmarks/multiline_latency_benchmark.py
+#
+
+import re
+import time
+
+from logging import Handler, LogRecord, INFO
+from threading import Event
+
+from encab_gelf.handlers import MultiLineHandler
+from encab_gelf.log_line_recognizer import DefaultRecognizer
+
+ROUNDS = 5
+
+
+class LatencyHandler(Handler):
+    def __init__(self):
+        super().__init__()
+        self.received = Event()
+
+    def emit(self, record):
+        self.received.set()
+
+
+def measure(early_flush):
+    upstream = LatencyHandler()
+    handler = MultiLineHandler(
+        "benchmark",
+        upstream,
+        recognizer=DefaultRecognizer(),
+        continuation=re.compile(r"\s|Caused by:"),
+        early_flush=early_flush,
+    )
+    total = 0.0
+    for i in range(ROUNDS):
+        upstream.received.clear()
+        record = LogRecord(
+            "benchmark", INFO, __file__, 0, f"ERROR alert {i}", None, None
+        )
+        start = time.perf_counter()
+        handler.emit(record)
+        upstream.received.wait()
+        total += time.perf_counter() - start
+    handler.close()
+    return total / ROUNDS
+
+
+def main():
+    for name, early_flush in (("timeout", False), ("early flush", True)):
+        print(f"{name:24} {measure(early_flush) * 1e3:8.2f} ms/record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#
+# Compares nested handlers (a multi-line handler wrapping a recognizing handler)
+# with a single pipeline running the same stages.
+#
+# usage: python tests/benchmarks/pipeline_benchmark.py
+#
+
+import timeit
+
+from logging import Handler, LogRecord, INFO
+
+from encab_gelf.handlers import (
+    MultiLineHandler,
+    MultiLineStage,
+    Pipeline,
+    RecognizingHandler,
+    RecognizingStage,
+)
+
+ROUNDS = 50000
+
+
+class NullHandler(Handler):
+    def emit(self, record):
+        pass
+
+
+def main():
+    record = LogRecord("program", INFO, __file__, 0, "INFO Message", None, None)
+    nested = MultiLineHandler(
+        "benchmark", RecognizingHandler(NullHandler(), "benchmark")
+    )
+    fused = Pipeline("benchmark", [MultiLineStage(), RecognizingStage()], NullHandler())
+
+    for name, handler in (("nested handlers", nested), ("pipeline", fused)):
+        seconds = timeit.timeit(lambda: handler.handle(record), number=ROUNDS)
+        print(f"{name:24} {seconds / ROUNDS * 1e6:8.2f} us/record")
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
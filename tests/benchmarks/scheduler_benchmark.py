@@ -0,0 +1,56 @@
+#
+# Compares one threading.Timer per multi-line stream with the scheduler
+# shared by all handlers: threads used and cost of arming a deadline.
+#
+# usage: python tests/benchmarks/scheduler_benchmark.py
+#
+
+import threading
+import timeit
+
+from encab_gelf.scheduler import Scheduler
+
+STREAMS = 200
+ROUNDS = 20000
+TIMEOUT = 0.5
+
+
+def noop(*args):
+    pass
+
+
+def main():
+    threads = threading.active_count()
+    timers = [threading.Timer(TIMEOUT, noop) for _ in range(STREAMS)]
+    for timer in timers:
+        timer.start()
+    print(f"{'Timer':24} {threading.active_count() - threads:8} threads")
+    for timer in timers:
+        timer.cancel()
+
+    def arm():
+        timer = threading.Timer(TIMEOUT, noop)
+        timer.start()
+        timer.cancel()
+
+    seconds = timeit.timeit(arm, number=ROUNDS)
+    print(f"{'Timer':24} {seconds / ROUNDS * 1e6:8.2f} us/arm")
+    for thread in threading.enumerate():
+        if isinstance(thread, threading.Timer):
+            thread.join()
+
+    threads = threading.active_count()
+    scheduler = Scheduler()
+    for stream in range(STREAMS):
+        scheduler.schedule(TIMEOUT, noop, stream)
+    print(f"{'Scheduler':24} {threading.active_count() - threads:8} threads")
+
+    seconds = timeit.timeit(
+        lambda: scheduler.schedule(TIMEOUT, noop).cancel(), number=ROUNDS
+    )
+    print(f"{'Scheduler':24} {seconds / ROUNDS * 1e6:8.2f} us/arm")
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#
+# Measures the reconnect latency of GelfTlsHandler against a local TLS server:
+# a new SSL context and full handshake per connection (as ssl.wrap_socket did)
+# versus the shared context with session resumption.
+#
+# usage: python tests/benchmarks/tls_reconnect_benchmark.py
+#
+
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+
+from threading import Thread
+
+from encab_gelf.gelf.handlers import GelfTlsHandler, create_ssl_context
+
+RECONNECTS = 200
+
+
+def serve(server, context):
+    def receive(connection):
+        try:
+            with context.wrap_socket(connection, server_side=True) as tls:
+                while tls.recv(4096):
+                    pass
+        except OSError:
+            pass
+
+    while True:
+        try:
+            connection, _ = server.accept()
+        except OSError:
+            return
+        Thread(target=receive, args=(connection,), daemon=True).start()
+
+
+def legacy_handshake(port):
+    sock = socket.create_connection(("127.0.0.1", port), 1)
+    # ssl.wrap_socket created a new context for every connection
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context.wrap_socket(sock)
+
+
+def full_handshake(port, context):
+    sock = socket.create_connection(("127.0.0.1", port), 1)
+    return context.wrap_socket(sock, server_hostname="127.0.0.1")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = os.path.join(directory, "cert.pem")
+        keyfile = os.path.join(directory, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes"]
+            + ["-subj", "/CN=localhost", "-days", "1"]
+            + ["-keyout", keyfile, "-out", certfile],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(target=serve, args=(server, context), daemon=True).start()
+
+    start = time.perf_counter()
+    for _ in range(RECONNECTS):
+        legacy_handshake(port).close()
+    legacy = time.perf_counter() - start
+
+    shared_context = create_ssl_context()
+    start = time.perf_counter()
+    for _ in range(RECONNECTS):
+        full_handshake(port, shared_context).close()
+    shared = time.perf_counter() - start
+
+    handler = GelfTlsHandler("127.0.0.1", port)
+    sock = handler.makeSocket()
+    time.sleep(0.1)  # wait for the session ticket
+    handler.updateSession(sock)
+    sock.close()
+
+    start = time.perf_counter()
+    for _ in range(RECONNECTS):
+        handler.makeSocket().close()
+    resumed = time.perf_counter() - start
+
+    print(
+        f"new context, full handshake     {legacy / RECONNECTS * 1e3:6.2f} ms/reconnect"
+    )
+    print(
+        f"shared context, full handshake  {shared / RECONNECTS * 1e3:6.2f} ms/reconnect"
+    )
+    print(
+        f"shared context, resumption      {resumed / RECONNECTS * 1e3:6.2f} ms/reconnect"
+        f" ({handler.resumed} of {RECONNECTS} resumed)"
+    )
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#
+# Compares formatting the same exception with traceback.format_exception
+# with the cached formatting of the GELF handlers.
+#
+# usage: python tests/benchmarks/traceback_benchmark.py
+#
+
+import sys
+import timeit
+import traceback
+
+from encab_gelf.gelf import gelf
+
+ROUNDS = 20000
+
+
+def recurse(depth):
+    if depth:
+        recurse(depth - 1)
+    raise RuntimeError("crash loop")
+
+
+def main():
+    try:
+        recurse(30)
+    except RuntimeError:
+        exc_info = sys.exc_info()
+
+    for name, format in (
+        ("format_exception", lambda: "\n".join(traceback.format_exception(*exc_info))),
+        ("cached", lambda: gelf.format_exception(exc_info)),
+    ):
+        seconds = timeit.timeit(format, number=ROUNDS)
+        print(f"{name:24} {seconds / ROUNDS * 1e6:8.2f} us/record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#
+# Compares the former copying UDP chunker with the memoryview based one
+# on a large uncompressed stack trace.
+#
+# usage: python tests/benchmarks/udp_chunking_benchmark.py
+#
+
+import json
+import os
+import socket
+import struct
+import timeit
+
+from encab_gelf.gelf import gelf
+
+CHUNK_SIZE = 1300
+ROUNDS = 2000
+
+
+def legacy_split(data, chunk_size):
+    header = b"\x1e\x0f"
+    message_id = os.urandom(8)
+    chunks = [data[pos : pos + chunk_size] for pos in range(0, len(data), chunk_size)]
+    number_of_chunks = len(chunks)
+
+    for chunk_index, chunk in enumerate(chunks):
+        yield b"".join(
+            (
+                header,
+                message_id,
+                struct.pack("B", chunk_index),
+                struct.pack("B", number_of_chunks),
+                chunk,
+            )
+        )
+
+
+def stack_trace_message():
+    trace = "\n".join(
+        ["java.lang.IllegalStateException: benchmark"]
+        + [
+            f"    at com.example.Service.method{i}(Service.java:{i})"
+            for i in range(1000)
+        ]
+    )
+    return json.dumps({"short_message": "crash", "full_message": trace}).encode()
+
+
+def main():
+    data = stack_trace_message()
+    chunks = (len(data) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    print(f"message: {len(data)} bytes, {chunks} chunks of {CHUNK_SIZE} bytes")
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    address = server.getsockname()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def legacy():
+        for chunk in legacy_split(data, CHUNK_SIZE):
+            sock.sendto(chunk, ("localhost", address[1]))
+
+    connected = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    connected.connect(address)
+
+    def current():
+        for header, chunk in gelf.split(data, CHUNK_SIZE):
+            connected.sendmsg((header, chunk))
+
+    def drain():
+        server.setblocking(False)
+        try:
+            while True:
+                server.recv(65536)
+        except BlockingIOError:
+            pass
+
+    for name, split in (
+        ("legacy split", lambda: list(legacy_split(data, CHUNK_SIZE))),
+        ("memoryview split", lambda: list(gelf.split(data, CHUNK_SIZE))),
+    ):
+        seconds = timeit.timeit(split, number=ROUNDS)
+        print(f"{name:24} {seconds / ROUNDS * 1e6:8.1f} us/message")
+
+    for name, send in (("legacy send", legacy), ("sendmsg send", current)):
+        seconds = 0.0
+        for _ in range(ROUNDS // 100):
+            seconds += timeit.timeit(send, number=100)
+            drain()
+        print(f"{name:24} {seconds / ROUNDS * 1e6:8.1f} us/message")
+
+    server.close()
+    sock.close()
+    connected.close()
+
+
+if __name__ == "__main__":
+    main()
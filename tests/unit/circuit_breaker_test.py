@@ -0,0 +1,42 @@
+import unittest
+import time
+
+from encab_gelf.circuit_breaker import CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_open(self):
+        breaker = CircuitBreaker(failure_threshold=2, retry_delay=0.1)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.failed())
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.failed())
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+
+    def test_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, retry_delay=0.1)
+        breaker.failed()
+        time.sleep(0.15)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        self.assertFalse(breaker.allow(), "only one probe at a time")
+
+        breaker.succeeded()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        self.assertTrue(breaker.allow())
+
+    def test_backoff(self):
+        breaker = CircuitBreaker(
+            failure_threshold=1, retry_delay=0.1, max_retry_delay=0.3
+        )
+        breaker.failed()
+        for delay in (0.2, 0.3, 0.3):
+            breaker.state = CircuitBreaker.HALF_OPEN
+            breaker.failed()
+            self.assertAlmostEqual(delay, breaker.delay)
+            self.assertTrue(breaker.retry_at - time.monotonic() <= delay)
+
+        breaker.succeeded()
+        self.assertEqual(0.1, breaker.delay)
@@ -94,3 +94,63 @@ class GelfSettingsTest(unittest.TestCase):
         self.assertEqual(12121, handler.port)
         self.assertEqual({"localname": "encab2"}, handler.optional_fields)
         self.assertEqual(True, handler.enabled)
+
+    def testFieldSettings(self):
+        settings_data = {
+            "handlers": {
+                "default": {
+                    "protocol": "HTTP",
+                    "host": "localhost",
+                    "fields": {
+                        "exclude": ["thread"],
+                        "rename": {"timestamp": "_source_timestamp"},
+                        "prefix": True,
+                    },
+                }
+            }
+        }
+
+        settings = GelfSettings.load(settings_data)
+        fields = settings.handlers["default"].fields
+        self.assertIsNone(fields.include)
+        self.assertEqual(["thread"], fields.exclude)
+        self.assertEqual({"timestamp": "_source_timestamp"}, fields.rename)
+        self.assertTrue(fields.prefix)
+        self.assertFalse(fields.is_identity())
+
+    def testRateLimitSettings(self):
+        settings_data = {
+            "handlers": {
+                "default": {
+                    "protocol": "HTTP",
+                    "host": "localhost",
+                    "rate_limit": {"burst": 500, "levels": {"DEBUG": 10}},
+                }
+            }
+        }
+
+        settings = GelfSettings.load(settings_data)
+        rate_limit = settings.handlers["default"].rate_limit
+        self.assertEqual(0, rate_limit.rate)
+        self.assertEqual(500, rate_limit.burst)
+        self.assertEqual({"DEBUG": 10}, rate_limit.levels)
+        self.assertEqual(60, rate_limit.summary_interval)
+        self.assertFalse(rate_limit.is_unlimited())
+
+    def testFilterSettings(self):
+        settings_data = {
+            "handlers": {
+                "default": {
+                    "protocol": "HTTP",
+                    "host": "localhost",
+                    "filter": {"min_level": "INFO", "exclude": ["cron"]},
+                }
+            }
+        }
+
+        settings = GelfSettings.load(settings_data)
+        filter_settings = settings.handlers["default"].filter
+        self.assertEqual("INFO", filter_settings.min_level)
+        self.assertIsNone(filter_settings.include)
+        self.assertEqual(["cron"], filter_settings.exclude)
+        self.assertEqual([], filter_settings.exclude_messages)
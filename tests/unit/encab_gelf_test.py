@@ -1,9 +1,22 @@
 import unittest
 import os
+import json
+import socket
 
+from typing import cast
+from logging import LogRecord, INFO
 
-from encab_gelf.config import GelfSettings
-from encab_gelf.encab_gelf import extension, configure_extension, ENCAB_GELF
+
+from encab_gelf.config import GelfSettings, ConfigError
+from encab_gelf.encab_gelf import (
+    extension,
+    configure_extension,
+    validate_extension,
+    GelfLogHandlerFactory,
+    ENCAB_GELF,
+)
+from encab_gelf.handlers import ErrorHandler, ErrorReporter
+from encab_gelf.gelf.engine import GelfEngineHandler
 
 
 class EncabGelfTest(unittest.TestCase):
@@ -73,3 +86,145 @@ class EncabGelfTest(unittest.TestCase):
         self.assertEqual(12121, handler.port)
         self.assertEqual({"localname": "encab2"}, handler.optional_fields)
         self.assertEqual(True, handler.enabled)
+
+    def testSharedPayload(self):
+        servers = list()
+        for _ in range(3):
+            server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            server.bind(("127.0.0.1", 0))
+            server.settimeout(2)
+            servers.append(server)
+
+        def handler(server: socket.socket, **settings):
+            return {
+                "protocol": "UDP",
+                "host": "127.0.0.1",
+                "port": server.getsockname()[1],
+                "compress": False,
+                **settings,
+            }
+
+        settings = GelfSettings.load(
+            {
+                "handlers": {
+                    "first": handler(servers[0]),
+                    "second": handler(servers[1]),
+                    "other": handler(servers[2], optional_fields={"_app": "other"}),
+                }
+            }
+        )
+        factory = GelfLogHandlerFactory(settings)
+        handlers = list(factory.createAll())
+        self.assertEqual(2, len(handlers))
+
+        for handler in handlers:
+            handler.emit(LogRecord("test", INFO, "test.py", 1, "Message", None, None))
+            handler.close()
+
+        messages = [json.loads(server.recv(2048)) for server in servers]
+        self.assertEqual(["Message"] * 3, [m["short_message"] for m in messages])
+        self.assertEqual("other", messages[2]["_app"])
+        self.assertNotIn("_app", messages[0])
+
+        for server in servers:
+            server.close()
+
+    def testPayloadKey(self):
+        settings = GelfSettings.load(
+            {
+                "handlers": {
+                    "auto": {"protocol": "UDP", "host": "localhost"},
+                    "json": {
+                        "protocol": "UDP",
+                        "host": "localhost",
+                        "json_encoder": "json",
+                    },
+                }
+            }
+        )
+        factory = GelfLogHandlerFactory(settings)
+        self.assertNotEqual(
+            factory.payloadKey(settings.handlers["auto"]),
+            factory.payloadKey(settings.handlers["json"]),
+        )
+
+    def testSpoolWithBatch(self):
+        settings = GelfSettings.load(
+            {
+                "handlers": {
+                    "default": {
+                        "protocol": "HTTP",
+                        "host": "localhost",
+                        "batch": True,
+                        "spool_dir": "/tmp/encab_gelf_spool",
+                    }
+                }
+            }
+        )
+        with self.assertRaises(ConfigError):
+            list(GelfLogHandlerFactory(settings).createAll())
+
+    def testSpoolWithUdp(self):
+        settings = GelfSettings.load(
+            {
+                "handlers": {
+                    "default": {
+                        "protocol": "UDP",
+                        "host": "localhost",
+                        "spool_dir": "/tmp/encab_gelf_spool",
+                    }
+                }
+            }
+        )
+        with self.assertRaises(ConfigError):
+            list(GelfLogHandlerFactory(settings).createAll())
+
+    def testValidateExtension(self):
+        handler = {"protocol": "UDP", "host": "127.0.0.1"}
+        validate_extension(ENCAB_GELF, True, {"handlers": {"default": handler}})
+
+        invalid = [
+            {"engine": "trio"},
+            {"handlers": {"default": {**handler, "json_encoder": "ujson"}}},
+            {
+                "handlers": {
+                    "default": {**handler, "asynchronous": True, "overflow": "wait"}
+                }
+            },
+            {"handlers": {"default": {**handler, "spool_dir": "/tmp/spool"}}},
+            {"handlers": {"default": {**handler, "multiline_continuation": "("}}},
+            {"handlers": {"default": {**handler, "filter": {"min_level": "LOUD"}}}},
+            {
+                "handlers": {
+                    "default": {**handler, "filter": {"exclude_messages": ["[a-"]}}
+                }
+            },
+        ]
+        for settings in invalid:
+            with self.subTest(settings=settings):
+                with self.assertRaises(ConfigError):
+                    validate_extension(ENCAB_GELF, True, settings)
+
+        # disabled handlers aren't created, so they aren't checked either
+        disabled = {**handler, "enabled": False, "filter": {"min_level": "LOUD"}}
+        validate_extension(ENCAB_GELF, True, {"handlers": {"default": disabled}})
+
+    def testEngineReporter(self):
+        settings = GelfSettings.load(
+            {
+                "engine": "asyncio",
+                "handlers": {"default": {"protocol": "UDP", "host": "127.0.0.1"}},
+            }
+        )
+        factory = GelfLogHandlerFactory(settings)
+        handlers = [handler for _ in range(2) for handler in factory.createAll()]
+
+        outputs = [
+            cast(GelfEngineHandler, cast(ErrorHandler, handler.output).handler).output
+            for handler in handlers
+        ]
+        self.assertIs(outputs[0], outputs[1])
+        reporter = getattr(outputs[0].on_error, "__self__")
+        self.assertIsInstance(reporter, ErrorReporter)
+        for handler in handlers:
+            handler.close()
@@ -0,0 +1,80 @@
+import unittest
+import json
+import datetime
+import collections
+
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+
+from encab_gelf.gelf import encoders
+from encab_gelf.gelf.gelf import object_to_json
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Level(str):
+    pass
+
+
+class Color(Enum):
+    RED = 1
+
+
+class Number(IntEnum):
+    ONE = 1
+
+
+MESSAGES = [
+    {"short_message": "Message", "timestamp": 1700000000.123456, "level": 6},
+    {"short_message": "Nachricht über ✓", "_count": 2**40, "_ratio": 0.1},
+    {"_list": [1, "2", None, True], "_dict": {"a": {"b": []}}, "_empty": ""},
+    {
+        "_datetime": datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+        "_utc": datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+        "_date": datetime.date(2024, 1, 2),
+        "_time": datetime.time(3, 4, 5),
+    },
+    {"_object": Point(1, 2), "_set": {1}, "_level": Level("INFO")},
+    {"_keys": {1: "one", 2.5: "two"}, "_huge": 2**70},
+    {
+        "_ordered": collections.OrderedDict(a=1),
+        "_default": collections.defaultdict(list, a=[1]),
+        "_tuple": (1, 2),
+    },
+    {"_enum": Color.RED, "_int_enum": Number.ONE, "_nested": [{"_enum": Color.RED}]},
+    {"_nan": float("nan"), "_inf": float("inf"), "_list": [float("-inf")]},
+]
+
+
+class EncoderTest(unittest.TestCase):
+    def test_create(self):
+        with self.assertRaises(ValueError):
+            encoders.create("simplejson", object_to_json)
+
+        encode = encoders.create(encoders.JSON, object_to_json)
+        self.assertEqual(b'{"a":1}', encode({"a": 1}))
+
+    @unittest.skipIf(encoders.orjson is not None, "orjson is installed")
+    def test_auto_without_orjson(self):
+        encode = encoders.create(encoders.AUTO, object_to_json)
+        self.assertEqual(b'{"a":"\\u00fc"}', encode({"a": "ü"}))
+
+        with self.assertRaises(ValueError):
+            encoders.create(encoders.ORJSON, object_to_json)
+
+    @unittest.skipIf(encoders.orjson is None, "orjson is not installed")
+    def test_orjson_conformance(self):
+        reference = encoders.create(encoders.JSON, object_to_json)
+        encode = encoders.create(encoders.ORJSON, object_to_json)
+
+        for message in MESSAGES:
+            with self.subTest(message=message):
+                # NaN isn't equal to itself, the constants are compared as strings
+                self.assertEqual(
+                    json.loads(reference(message), parse_constant=str),
+                    json.loads(encode(message), parse_constant=str),
+                )
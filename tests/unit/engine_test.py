@@ -0,0 +1,144 @@
+import unittest
+import json
+import socket
+import zlib
+
+from typing import List, cast
+from threading import Thread
+from logging import LogRecord, INFO
+
+from encab_gelf.gelf.engine import (
+    TransportEngine,
+    UdpOutput,
+    TcpOutput,
+    HttpOutput,
+    GelfEngineHandler,
+)
+from encab_gelf.gelf.pool import HttpStatusError
+
+from tests.unit.gelf_server import GelfServer
+
+
+class TransportEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.engine = TransportEngine()
+
+    def tearDown(self) -> None:
+        self.engine.close()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/engine_test.py", 24, msg, None, None)
+
+    def emit(self, handler: GelfEngineHandler, count: int) -> None:
+        for i in range(count):
+            handler.emit(self.record(f"Message {i}"))
+        handler.flush()
+
+    def test_udp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(2)
+        port = server.getsockname()[1]
+        output = self.engine.add(UdpOutput("127.0.0.1", port))
+        handler = GelfEngineHandler(self.engine, output, compress=True)
+
+        self.emit(handler, 3)
+
+        messages = [
+            json.loads(zlib.decompress(server.recv(2048)))["short_message"]
+            for _ in range(3)
+        ]
+        self.assertEqual(["Message 0", "Message 1", "Message 2"], messages)
+        self.assertEqual(3, output.sent)
+        server.close()
+
+    def test_tcp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        output = self.engine.add(TcpOutput("127.0.0.1", port))
+        handler = GelfEngineHandler(self.engine, output)
+
+        self.emit(handler, 3)
+
+        connection, _ = server.accept()
+        connection.settimeout(2)
+        data = b""
+        while data.count(b"\x00") < 3:
+            data += connection.recv(4096)
+
+        messages = [
+            json.loads(frame)["short_message"] for frame in data.split(b"\x00")[:-1]
+        ]
+        self.assertEqual(["Message 0", "Message 1", "Message 2"], messages)
+        connection.close()
+        server.close()
+
+    def test_http(self):
+        server = GelfServer(chunked=True)
+        Thread(target=server.serve_forever, daemon=True).start()
+        output = self.engine.add(HttpOutput("127.0.0.1", server.server_address[1]))
+        handler = GelfEngineHandler(self.engine, output, compress=True)
+
+        self.emit(handler, 5)
+
+        messages = sorted(
+            json.loads(zlib.decompress(body))["short_message"] for body in server.bodies
+        )
+        self.assertEqual([f"Message {i}" for i in range(5)], messages)
+        self.assertEqual(5, output.sent)
+        server.shutdown()
+        server.server_close()
+
+    def test_http_batch(self):
+        server = GelfServer(chunked=True)
+        Thread(target=server.serve_forever, daemon=True).start()
+        output = self.engine.add(
+            HttpOutput("127.0.0.1", server.server_address[1], concurrency=1, batch=True)
+        )
+        handler = GelfEngineHandler(self.engine, output)
+
+        self.emit(handler, 5)
+
+        messages = [
+            json.loads(line)["short_message"]
+            for body in server.bodies
+            for line in zlib.decompress(body).split(b"\n")
+        ]
+        self.assertEqual([f"Message {i}" for i in range(5)], messages)
+        server.shutdown()
+        server.server_close()
+
+    def test_http_status(self):
+        server = GelfServer(chunked=True)
+        server.status = 500
+        Thread(target=server.serve_forever, daemon=True).start()
+        errors: List[Exception] = list()
+        output = self.engine.add(HttpOutput("127.0.0.1", server.server_address[1]))
+        output.on_error = errors.append
+        handler = GelfEngineHandler(self.engine, output)
+
+        handler.emit(self.record("Message 0"))
+        self.engine.flush(0.5)
+
+        self.assertEqual(500, cast(HttpStatusError, errors[0]).status)
+        self.assertEqual(0, output.sent)
+        server.shutdown()
+        server.server_close()
+
+    def test_unreachable_output(self):
+        errors: List[Exception] = list()
+        output = self.engine.add(TcpOutput("127.0.0.1", 1, buffer_size=2))
+        output.on_error = errors.append
+        handler = GelfEngineHandler(self.engine, output)
+
+        for i in range(5):
+            handler.emit(self.record(f"Message {i}"))
+        self.engine.flush(0.5)
+
+        self.assertTrue(errors)
+        self.assertTrue(isinstance(errors[0], ConnectionError))
+        self.assertEqual(0, output.sent)
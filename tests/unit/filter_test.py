@@ -0,0 +1,35 @@
+import unittest
+
+from logging import DEBUG, INFO
+
+from encab_gelf.handlers import Pipeline, RecognizingStage
+from encab_gelf.filter import FilterStage
+from tests.unit.log_records import TestHandler, record
+
+
+class FilterStageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.test_handler = TestHandler()
+
+    def test_programs(self):
+        stage = FilterStage(include=["web", "worker"], exclude=["worker"])
+        pipeline = Pipeline("test", [stage], self.test_handler)
+        for program in ("web", "worker", "cron"):
+            pipeline.handle(record(f"{program} Message", program))
+        self.assertEqual(["web Message"], self.test_handler.messages)
+
+    def test_messages(self):
+        stage = FilterStage(exclude_messages=["DEBUG", r"\s*health check"])
+        pipeline = Pipeline("test", [stage], self.test_handler)
+        for msg in ("DEBUG query", "  health check ok", "INFO started", "no DEBUG"):
+            pipeline.handle(record(msg))
+        self.assertEqual(["INFO started", "no DEBUG"], self.test_handler.messages)
+
+    def test_min_level(self):
+        stages = [RecognizingStage(), FilterStage(min_level=INFO)]
+        pipeline = Pipeline("test", stages, self.test_handler)
+        pipeline.handle(record("DEBUG query"))
+        pipeline.handle(record("INFO started"))
+        pipeline.handle(record("python record", level=DEBUG))
+        self.assertEqual(["INFO started"], self.test_handler.messages)
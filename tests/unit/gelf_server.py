@@ -0,0 +1,50 @@
+#
+# HTTP server that records the bodies of GELF HTTP requests, shared by the tests
+#
+
+from typing import List
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class GelfRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        assert isinstance(server, GelfServer)
+        length = int(self.headers["Content-Length"])
+        server.bodies.append(self.rfile.read(length))
+        server.ports.add(self.client_address[1])
+        drop_connection = server.drop_connections
+        self.send_response(server.status)
+        if server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", "0")
+        if server.close_connections:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if server.chunked:
+            self.wfile.write(b"2\r\nok\r\n0\r\n\r\n")
+        if drop_connection:
+            # close the connection without telling the client
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GelfServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, chunked: bool = False) -> None:
+        """
+        :param chunked: send the response body in chunks
+        """
+        super().__init__(("127.0.0.1", 0), GelfRequestHandler)
+        self.bodies: List[bytes] = list()
+        self.ports: set = set()
+        self.chunked = chunked
+        self.status = 202
+        self.close_connections = False
+        self.drop_connections = False
@@ -0,0 +1,443 @@
+import unittest
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import zlib
+
+from typing import List
+from threading import Thread
+from logging import LogRecord, INFO
+
+from encab_gelf.gelf import gelf
+from encab_gelf.gelf.handlers import (
+    BaseHandler,
+    GelfUdpHandler,
+    GelfTcpHandler,
+    GelfTlsHandler,
+)
+
+
+class SplitTest(unittest.TestCase):
+    def chunks(self, data: bytes, chunk_size: int):
+        return [bytes(header) + chunk for header, chunk in gelf.split(data, chunk_size)]
+
+    def test_split(self):
+        data = os.urandom(2500)
+        chunks = self.chunks(data, 1000)
+
+        self.assertEqual(3, len(chunks))
+        message_id = chunks[0][2:10]
+        for index, chunk in enumerate(chunks):
+            self.assertEqual(gelf.CHUNK_MAGIC, chunk[0:2])
+            self.assertEqual(message_id, chunk[2:10])
+            self.assertEqual(index, chunk[10])
+            self.assertEqual(3, chunk[11])
+        self.assertEqual(data, b"".join(chunk[12:] for chunk in chunks))
+
+    def test_message_ids(self):
+        first = self.chunks(b"x" * 20, 10)[0][2:10]
+        second = self.chunks(b"x" * 20, 10)[0][2:10]
+        self.assertNotEqual(first, second)
+
+    def test_max_chunks(self):
+        chunks = self.chunks(b"x" * 1280, 10)
+        self.assertEqual(128, len(chunks))
+        self.assertEqual(128, chunks[-1][11])
+        self.assertEqual(127, chunks[-1][10])
+
+        with self.assertRaises(gelf.MessageTooLarge):
+            self.chunks(b"x" * 1281, 10)
+
+
+class EnvelopeTest(unittest.TestCase):
+    def record(self, **extra) -> LogRecord:
+        record = LogRecord("test", INFO, "gelf_test.py", 24, "Message", None, None)
+        record.extra = extra  # type: ignore
+        return record
+
+    def legacy(self, handler: BaseHandler, record: LogRecord) -> dict:
+        fields = {**handler.additional_fields, **record.extra}  # type: ignore
+        return gelf.make(
+            record,
+            handler.domain,
+            handler.debug,
+            handler.version,
+            fields,
+            handler.additional_env_fields,
+            handler.include_extra_fields,
+        )
+
+    def test_envelope(self):
+        handler = BaseHandler(debug=True, _app="encab", _stage=3)
+        record = self.record(_pid=42)
+        packed = handler.convert_record_to_gelf(record)
+
+        self.assertEqual(self.legacy(handler, record), json.loads(packed))
+        self.assertEqual(1, packed.count(b'"_app"'))
+
+    def test_overridden_field(self):
+        handler = BaseHandler(compress=True, _app="encab")
+        record = self.record(_app="program", host="other")
+        packed = zlib.decompress(handler.convert_record_to_gelf(record))
+
+        self.assertEqual(self.legacy(handler, record), json.loads(packed))
+        self.assertEqual("program", json.loads(packed)["_app"])
+        self.assertEqual(1, packed.count(b'"_app"'))
+
+    def test_env_fields(self):
+        os.environ["GELF_TEST_STAGE"] = "test"
+        handler = BaseHandler(
+            additional_env_fields={"stage": "GELF_TEST_STAGE"}, _app="encab"
+        )
+        record = self.record(_stage="record")
+        self.assertEqual(self.legacy(handler, record), self.convert(handler, record))
+        self.assertEqual("test", self.convert(handler, self.record())["_stage"])
+
+        os.environ["GELF_TEST_STAGE"] = "production"
+        self.assertEqual("test", self.convert(handler, self.record())["_stage"])
+        handler.refresh_environment()
+        self.assertEqual("production", self.convert(handler, self.record())["_stage"])
+
+        del os.environ["GELF_TEST_STAGE"]
+        handler.refresh_environment()
+        self.assertNotIn("_stage", self.convert(handler, self.record()))
+
+    def convert(self, handler: BaseHandler, record: LogRecord) -> dict:
+        return json.loads(handler.convert_record_to_gelf(record))
+
+
+class ProjectionTest(unittest.TestCase):
+    def test_project(self):
+        projection = gelf.Projection(
+            exclude=["thread"], rename={"timestamp": "_source_timestamp"}, prefix=True
+        )
+        fields = {"timestamp": "2024-01-02", "thread": "main", "logger": "app"}
+        projected: dict = dict()
+        projection.project(projected, fields)
+        projection.project(projected, {"_pid": 42})
+
+        self.assertEqual(
+            {"_source_timestamp": "2024-01-02", "_logger": "app", "_pid": 42},
+            projected,
+        )
+        self.assertEqual(
+            {"timestamp", "thread", "logger", "_pid"}, set(projection.names)
+        )
+
+    def test_include(self):
+        projection = gelf.Projection(include=["_app", "level"], exclude=["level"])
+        projected: dict = dict()
+        projection.project(projected, {"_app": "encab", "level": "INFO", "x": 1})
+        self.assertEqual({"_app": "encab"}, projected)
+
+    def test_handler(self):
+        handler = BaseHandler(
+            projection=gelf.Projection(prefix=True, exclude=["secret"]), _app="encab"
+        )
+        record = LogRecord("test", INFO, "gelf_test.py", 24, "Message", None, None)
+        record.extra = {"timestamp": "now", "secret": "x", "app": "program"}  # type: ignore
+        message = json.loads(handler.convert_record_to_gelf(record))
+
+        self.assertEqual("now", message["_timestamp"])
+        self.assertEqual(record.created, message["timestamp"])
+        self.assertEqual("program", message["_app"])
+        self.assertNotIn("secret", message)
+        self.assertNotIn("_secret", message)
+
+    def test_extra_fields(self):
+        projection = gelf.Projection(exclude=["secret"], rename={"user": "account"})
+        handler = BaseHandler(
+            include_extra_fields=True, projection=projection, _app="encab"
+        )
+        record = LogRecord("test", INFO, "gelf_test.py", 24, "Message", None, None)
+        record.user = "alice"  # type: ignore
+        record.secret = "x"  # type: ignore
+        message = json.loads(handler.convert_record_to_gelf(record))
+
+        self.assertEqual("alice", message["_account"])
+        self.assertNotIn("_user", message)
+        self.assertNotIn("_secret", message)
+
+        # a renamed attribute overrides a constant field
+        projection = gelf.Projection(exclude=["secret"], rename={"user": "_app"})
+        handler = BaseHandler(
+            include_extra_fields=True, projection=projection, _app="encab"
+        )
+        packed = handler.convert_record_to_gelf(record)
+        message = json.loads(packed)
+
+        self.assertEqual("alice", message["_app"])
+        self.assertEqual(1, packed.count(b'"_app"'))
+        self.assertNotIn("_secret", message)
+
+
+class SizeBudgetTest(unittest.TestCase):
+    def test_apply(self):
+        budget = gelf.SizeBudget(20, 30, 16)
+        message = {
+            "short_message": "x" * 100,
+            "full_message": "y" * 30,
+            "_blob": "z" * 17,
+            "_short": "abc",
+            "_number": 10**20,
+        }
+        budget.apply(message)
+
+        self.assertEqual("xxxxxx...[truncated]", message["short_message"])
+        self.assertEqual("y" * 30, message["full_message"])
+        self.assertEqual("zz...[truncated]", message["_blob"])
+        self.assertEqual("abc", message["_short"])
+        self.assertEqual(10**20, message["_number"])
+        self.assertEqual(1, budget.truncated)
+
+        budget.apply({"short_message": "short"})
+        self.assertEqual(1, budget.truncated)
+
+    def test_truncate_short(self):
+        budget = gelf.SizeBudget()
+        self.assertEqual("abcde", budget.truncate("abcdefghijklmnopqrstuvwxyz", 5))
+        self.assertEqual(
+            "a" * 14, budget.truncate("a" * 20, len(gelf.SizeBudget.MARKER))
+        )
+
+    def test_handler(self):
+        budget = gelf.SizeBudget(max_message_length=50, max_field_length=20)
+        handler = BaseHandler(size_budget=budget, _app="encab")
+        record = LogRecord("test", INFO, "gelf_test.py", 24, "m" * 1000, None, None)
+        record.extra = {"_app": "a" * 1000}  # type: ignore
+
+        message = json.loads(handler.convert_record_to_gelf(record))
+        self.assertEqual(50, len(message["short_message"]))
+        self.assertEqual(20, len(message["_app"]))
+        self.assertEqual(1, budget.truncated)
+
+
+def fail(message: str) -> None:
+    try:
+        raise ValueError(message)
+    except ValueError as e:
+        raise RuntimeError("failed") from e
+
+
+class ExceptionTest(unittest.TestCase):
+    def exc_info(self, message: str = "Expected Error"):
+        try:
+            fail(message)
+        except RuntimeError:
+            return sys.exc_info()
+        self.fail("no exception")
+
+    def test_fingerprint(self):
+        first = gelf.fingerprint(self.exc_info("first"))
+        self.assertEqual(first, gelf.fingerprint(self.exc_info("second")))
+
+        try:
+            raise RuntimeError("other location")
+        except RuntimeError:
+            self.assertNotEqual(first, gelf.fingerprint(sys.exc_info()))
+
+    def test_format_exception(self):
+        for message in ("first", "second", "first"):
+            exc_info = self.exc_info(message)
+            self.assertEqual(
+                "\n".join(traceback.format_exception(*exc_info)),
+                gelf.format_exception(exc_info),
+            )
+
+    def test_deduplicate(self):
+        handler = BaseHandler(exception_window=0.2)
+
+        def convert() -> dict:
+            record = LogRecord(
+                "test", INFO, "gelf_test.py", 24, "Crash", None, self.exc_info()
+            )
+            return json.loads(handler.convert_record_to_gelf(record))
+
+        first = convert()
+        self.assertIn("ValueError: Expected Error", first["full_message"])
+
+        for count in (1, 2):
+            repeated = convert()
+            self.assertNotIn("full_message", repeated)
+            self.assertEqual(count, repeated["_exception_repeat_count"])
+            self.assertEqual(
+                first["_exception_fingerprint"], repeated["_exception_fingerprint"]
+            )
+
+        time.sleep(0.25)
+        self.assertIn("full_message", convert())
+
+
+class GelfUdpHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.settimeout(2)
+
+    def tearDown(self) -> None:
+        self.server.close()
+        super().tearDown()
+
+    def test_chunked(self):
+        port = self.server.getsockname()[1]
+        handler = GelfUdpHandler("127.0.0.1", port, compress=False, chunk_size=100)
+        message = "Test Message " * 50
+        handler.emit(LogRecord("test", INFO, "gelf_test.py", 24, message, None, None))
+        handler.close()
+
+        chunks = list()
+        while not chunks or len(chunks) < chunks[0][11]:
+            chunks.append(self.server.recv(2048))
+
+        chunks.sort(key=lambda chunk: chunk[10])
+        data = b"".join(chunk[12:] for chunk in chunks)
+        self.assertEqual(message, json.loads(data)["short_message"])
+
+    def test_compressed(self):
+        port = self.server.getsockname()[1]
+        handler = GelfUdpHandler("127.0.0.1", port)
+        handler.emit(LogRecord("test", INFO, "gelf_test.py", 24, "Test", None, None))
+        handler.close()
+
+        data = zlib.decompress(self.server.recv(2048))
+        self.assertEqual("Test", json.loads(data)["short_message"])
+
+
+class GelfTcpHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.server.settimeout(2)
+        self.port = self.server.getsockname()[1]
+
+    def tearDown(self) -> None:
+        self.server.close()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "gelf_test.py", 24, msg, None, None)
+
+    def receive(self, frames: int) -> List[str]:
+        connection, _ = self.server.accept()
+        connection.settimeout(2)
+        data = b""
+        while data.count(b"\x00") < frames:
+            data += connection.recv(4096)
+        connection.close()
+        return [
+            json.loads(frame)["short_message"] for frame in data.split(b"\x00")[:-1]
+        ]
+
+    def test_emit(self):
+        handler = GelfTcpHandler("127.0.0.1", self.port)
+        handler.emit(self.record("Message1"))
+        handler.emit(self.record("Message2"))
+        self.assertEqual(["Message1", "Message2"], self.receive(2))
+        handler.close()
+
+    def test_write_linger(self):
+        handler = GelfTcpHandler(
+            "127.0.0.1", self.port, write_buffer_size=65536, write_linger=0.1
+        )
+        handler.emit(self.record("Message1"))
+        handler.emit(self.record("Message2"))
+        self.assertIsNone(handler.sock)
+        time.sleep(0.3)
+        self.assertEqual(["Message1", "Message2"], self.receive(2))
+        handler.close()
+
+    def test_write_buffer_size(self):
+        handler = GelfTcpHandler(
+            "127.0.0.1", self.port, write_buffer_size=100, write_linger=10
+        )
+        handler.emit(self.record("Message1"))
+        self.assertIsNone(handler.sock)
+        handler.emit(self.record("Message2"))
+        self.assertIsNotNone(handler.sock)
+        handler.emit(self.record("Message3"))
+        handler.close()
+        self.assertEqual(["Message1", "Message2", "Message3"], self.receive(3))
+
+
+class TlsServer(object):
+    def __init__(self, directory: str) -> None:
+        certfile = os.path.join(directory, "cert.pem")
+        keyfile = os.path.join(directory, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes"]
+            + ["-subj", "/CN=localhost", "-days", "1"]
+            + ["-keyout", keyfile, "-out", certfile],
+            check=True,
+            capture_output=True,
+        )
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.data: List[bytes] = list()
+        Thread(target=self.serve, daemon=True).start()
+
+    def serve(self) -> None:
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return
+            Thread(target=self.receive, args=(connection,), daemon=True).start()
+
+    def receive(self, connection: socket.socket) -> None:
+        try:
+            with self.context.wrap_socket(connection, server_side=True) as tls:
+                while data := tls.recv(4096):
+                    self.data.append(data)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+@unittest.skipUnless(shutil.which("openssl"), "openssl is required")
+class GelfTlsHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = TlsServer(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "gelf_test.py", 24, msg, None, None)
+
+    def test_session_resumption(self):
+        handler = GelfTlsHandler("127.0.0.1", self.server.port)
+        context = handler.ctx
+
+        handler.emit(self.record("Message1"))
+        time.sleep(0.2)  # the session ticket arrives after the handshake
+        handler.emit(self.record("Message2"))
+        self.assertIsNotNone(handler.session)
+        handler.close()
+
+        handler.emit(self.record("Message3"))
+        handler.close()
+
+        self.assertIs(context, handler.ctx)
+        self.assertEqual(1, handler.resumed)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            GelfTlsHandler("127.0.0.1", self.server.port, validate=True)
+        with self.assertRaises(ValueError):
+            GelfTlsHandler("127.0.0.1", self.server.port, keyfile="key.pem")
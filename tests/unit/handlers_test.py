@@ -1,15 +1,35 @@
 import unittest
+import os
+import json
+import tempfile
 import time
+import re
+import io
+import socket
+import contextlib
 
 from typing import List, Tuple, Optional, Any, Dict
+from threading import Event
 from logging import Handler, LogRecord, INFO, ERROR
 from encab_gelf.handlers import (
     ExtLogRecord,
     MultiLineHandler,
     ErrorHandler,
     RecognizingHandler,
+    AsyncHandler,
+    FanOutHandler,
+    Pipeline,
+    Stage,
+    MultiLineStage,
+    RecognizingStage,
+    GelfSender,
     mylogger,
 )
+from encab_gelf.spool import Spool
+from encab_gelf.gelf.gelf import MessageTooLarge
+from encab_gelf.gelf.handlers import BaseHandler, GelfUdpHandler, GelfTcpHandler
+from encab_gelf.log_line_recognizer import DefaultRecognizer
+from encab_gelf.circuit_breaker import CircuitBreaker
 
 
 class TestHandler(Handler):
@@ -26,6 +46,24 @@ class TestHandler(Handler):
         self.records.append((record.levelname, self.format(record), record.extra))
 
 
+class ExtLogRecordTest(unittest.TestCase):
+    def test_fromRecord(self):
+        log_record = LogRecord(
+            "test", INFO, "tests/unit/gelf_test.py", 24, "Message %s", ("1",), None
+        )
+        log_record.extra = {"program": "encab", "suppress": True}
+        time.sleep(0.01)
+
+        record = ExtLogRecord.fromRecord(log_record)
+        self.assertIsNot(log_record, record)
+        self.assertIs(record, ExtLogRecord.fromRecord(record))
+        self.assertEqual(log_record.created, record.created)
+        self.assertEqual("Message 1", record.getMessage())
+        self.assertTrue(record.suppress)
+        self.assertTrue(record.is_from_encab)
+        self.assertFalse(hasattr(log_record, "is_log_record"))
+
+
 class MultiLineHandlerTest(unittest.TestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -43,6 +81,8 @@ class MultiLineHandlerTest(unittest.TestCase):
     def test_emit(self):
         self.handler.emit(self.record(INFO, "Test Message1"))
         self.handler.emit(self.record(INFO, "Test Message2"))
+        self.assertEqual([("INFO", "Test Message1", {})], self.test_handler.records)
+        self.handler.close()
         self.assertEqual(
             [("INFO", "Test Message1", {}), ("INFO", "Test Message2", {})],
             self.test_handler.records,
@@ -53,6 +93,7 @@ class MultiLineHandlerTest(unittest.TestCase):
         self.handler.emit(self.record(INFO, " Test Submessage1", False))
         self.handler.emit(self.record(INFO, " Test Submessage2", False))
         self.handler.emit(self.record(INFO, "Test Message2"))
+        self.handler.close()
 
         self.assertEqual(
             [
@@ -72,6 +113,209 @@ class MultiLineHandlerTest(unittest.TestCase):
             self.test_handler.records,
         )
 
+    def test_emit_max_lines(self):
+        handler = MultiLineHandler("test", self.test_handler, max_lines=3)
+        handler.emit(self.record(INFO, "Test Message1"))
+        for i in range(4):
+            handler.emit(self.record(INFO, f" Test Submessage{i}", False))
+        self.assertEqual(2, handler.backlog_lines)
+        handler.close()
+
+        self.assertEqual(
+            [
+                ("INFO", "Test Message1\n Test Submessage0\n Test Submessage1", {}),
+                ("INFO", " Test Submessage2\n Test Submessage3", {}),
+            ],
+            self.test_handler.records,
+        )
+        self.assertEqual(0, handler.backlog_lines)
+
+    def test_emit_max_bytes(self):
+        handler = MultiLineHandler("test", self.test_handler, max_bytes=20)
+        handler.emit(self.record(INFO, "Test Message1"))
+        self.assertEqual(13, handler.backlog_bytes)
+        handler.emit(self.record(INFO, " Sub1", False))
+        self.assertEqual(19, handler.backlog_bytes)
+        handler.emit(self.record(INFO, " Sub2", False))
+        self.assertEqual(5, handler.backlog_bytes)
+        handler.close()
+
+        self.assertEqual(
+            [("INFO", "Test Message1\n Sub1", {}), ("INFO", " Sub2", {})],
+            self.test_handler.records,
+        )
+
+    def test_emit_interleaved(self):
+        def record(name: str, msg: str, thread: int, is_log_line: bool = True):
+            log_record = LogRecord(
+                name, INFO, "tests/unit/gelf_test.py", 24, msg, None, None
+            )
+            record = ExtLogRecord.fromRecord(log_record)
+            record.is_log_record = is_log_line
+            record.thread = thread
+            return record
+
+        self.handler.emit(record("program1", "Program1 Message", 1))
+        self.handler.emit(record("program2", "Program2 Message", 1))
+        self.handler.emit(record("program1", " Program1 Sub1", 1, False))
+        self.handler.emit(record("program2", " Program2 Sub1", 1, False))
+        self.handler.emit(record("program1", "Thread2 Message", 2))
+        self.handler.emit(record("program1", " Program1 Sub2", 1, False))
+        self.handler.emit(record("program1", " Thread2 Sub1", 2, False))
+        self.assertEqual(7, self.handler.backlog_lines)
+        self.handler.close()
+
+        self.assertEqual(
+            [
+                "Program1 Message\n Program1 Sub1\n Program1 Sub2",
+                "Program2 Message\n Program2 Sub1",
+                "Thread2 Message\n Thread2 Sub1",
+            ],
+            [record[1] for record in self.test_handler.records],
+        )
+
+    def test_emit_complete(self):
+        record = LogRecord(
+            "test", INFO, "tests/unit/gelf_test.py", 24, "Message %s", ("1",), None
+        )
+        self.handler.emit(record)
+        self.assertEqual([("INFO", "Message 1", {})], self.test_handler.records)
+        self.assertEqual(0, self.handler.backlog_lines)
+
+    def test_emit_continuation(self):
+        handler = MultiLineHandler(
+            "test",
+            self.test_handler,
+            recognizer=DefaultRecognizer(),
+            continuation=re.compile(r"\s|Caused by:"),
+        )
+        # is_log_record is ignored if a continuation pattern is set
+        handler.emit(self.record(INFO, "INFO Test Message1", False))
+        handler.emit(self.record(INFO, " at Test Submessage1"))
+        handler.emit(self.record(INFO, "Caused by: Test Submessage2"))
+        handler.emit(self.record(INFO, "Test Message2", False))
+        handler.close()
+
+        self.assertEqual(
+            [
+                "INFO Test Message1\n at Test Submessage1\nCaused by: Test Submessage2",
+                "Test Message2",
+            ],
+            [record[1] for record in self.test_handler.records],
+        )
+
+    def test_emit_stack_trace(self):
+        handler = MultiLineHandler(
+            "test",
+            self.test_handler,
+            recognizer=DefaultRecognizer(),
+            continuation=re.compile(r"\s"),
+        )
+        for line in ["INFO starting", "ERROR failed", "  at foo()", "  at bar()"]:
+            handler.emit(self.record(INFO, line))
+        handler.close()
+
+        self.assertEqual(
+            ["INFO starting", "ERROR failed\n  at foo()\n  at bar()"],
+            [record[1] for record in self.test_handler.records],
+        )
+
+    def test_emit_early_flush(self):
+        handler = MultiLineHandler(
+            "test",
+            self.test_handler,
+            continuation=re.compile(r"\s"),
+            early_flush=True,
+        )
+        handler.emit(self.record(INFO, "Test Message1"))
+        self.assertEqual(1, len(self.test_handler.records), "sent without delay")
+
+        handler.emit(self.record(INFO, " Test Submessage1"))
+        handler.emit(self.record(INFO, " Test Submessage2"))
+        self.assertEqual(2, handler.backlog_lines)
+        handler.close()
+
+        self.assertEqual(
+            ["Test Message1", " Test Submessage1\n Test Submessage2"],
+            [record[1] for record in self.test_handler.records],
+        )
+
+    def test_timeout(self):
+        handler = MultiLineHandler("test", self.test_handler, timeout=0.05)
+        handler.emit(self.record(INFO, "Test Message1"))
+        time.sleep(0.15)
+        self.assertEqual([("INFO", "Test Message1", {})], self.test_handler.records)
+
+
+class UpperStage(Stage):
+    def process(self, record: ExtLogRecord) -> Optional[ExtLogRecord]:
+        if record.getMessage() == "drop":
+            return None
+        record.msg = record.getMessage().upper()
+        return record
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.test_handler = TestHandler()
+
+    def record(self, msg: str, is_log_line: bool = True) -> LogRecord:
+        record = ExtLogRecord.fromRecord(
+            LogRecord("test", INFO, "tests/unit/gelf_test.py", 24, msg, None, None)
+        )
+        record.is_log_record = is_log_line
+        return record
+
+    def test_stages(self):
+        pipeline = Pipeline(
+            "test", [RecognizingStage(), UpperStage()], self.test_handler
+        )
+        pipeline.handle(self.record("error failed"))
+        pipeline.handle(self.record("drop"))
+        self.assertEqual([("ERROR", "ERROR FAILED", {})], self.test_handler.records)
+
+    def test_forward(self):
+        multi_line = MultiLineStage()
+        pipeline = Pipeline("test", [multi_line, UpperStage()], self.test_handler)
+        pipeline.handle(self.record("Message1"))
+        pipeline.handle(self.record(" Submessage1", False))
+        self.assertEqual(2, multi_line.backlog_lines)
+        self.assertEqual([], self.test_handler.records)
+
+        pipeline.close()
+        self.assertEqual(
+            [("INFO", "MESSAGE1\n SUBMESSAGE1", {})], self.test_handler.records
+        )
+
+    def test_close(self):
+        gelf_handlers = [GelfUdpHandler("127.0.0.1", 12201) for _ in range(2)]
+        output = FanOutHandler(
+            [ErrorHandler(handler, "test", "localhost") for handler in gelf_handlers]
+        )
+        pipeline = Pipeline("test", [MultiLineStage()], output)
+        pipeline.handle(self.record("Message1"))
+        pipeline.flush()
+        self.assertIsNotNone(gelf_handlers[1].sock, "the block is sent")
+
+        pipeline.close()
+        self.assertEqual([None, None], [handler.sock for handler in gelf_handlers])
+
+    def test_refresh_environment(self):
+        os.environ["GELF_TEST_STAGE"] = "test"
+        gelf_handler = GelfUdpHandler(
+            "127.0.0.1", 12201, additional_env_fields={"stage": "GELF_TEST_STAGE"}
+        )
+        output = AsyncHandler(gelf_handler, ErrorHandler(gelf_handler, "a", "udp"))
+        pipeline = Pipeline("test", [], FanOutHandler([output]))
+        self.assertEqual({"_stage": "test"}, gelf_handler.environment[0])
+
+        os.environ["GELF_TEST_STAGE"] = "production"
+        pipeline.refresh_environment()
+        self.assertEqual({"_stage": "production"}, gelf_handler.environment[0])
+        del os.environ["GELF_TEST_STAGE"]
+        pipeline.close()
+
 
 class RecognizingHandlerTest(unittest.TestCase):
     def setUp(self) -> None:
@@ -136,6 +380,12 @@ class ErrorHandlerTest(unittest.TestCase):
             self.test_handler.records,
         )
 
+    def test_gelf_sender(self):
+        # only the GELF handlers send, so the error handler spools only for them
+        self.assertIsInstance(GelfUdpHandler("127.0.0.1", 12201), GelfSender)
+        self.assertNotIsInstance(BaseHandler(), GelfSender)
+        self.assertIsNone(self.handler.sender)
+
     def test_exception_in_emit(self):
         self.test_handler.exception = RuntimeError("Expected Error")
         self.handler.emit(self.record(INFO, "Test Message1"))
@@ -148,3 +398,311 @@ class ErrorHandlerTest(unittest.TestCase):
             "GELF Handler test connecting to localhost: Expected Error",
             record[1].split("\n")[0],
         )
+
+    def test_udp_unreachable(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        server.close()
+
+        gelf_handler = GelfUdpHandler("127.0.0.1", port, compress=False)
+        handler = ErrorHandler(gelf_handler, "test", f"udp://127.0.0.1:{port}")
+        standalone = GelfUdpHandler("127.0.0.1", port, compress=False)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            for i in range(3):
+                handler.emit(self.record(INFO, f"Test Message{i}"))
+                standalone.emit(self.record(INFO, f"Test Message{i}"))
+                time.sleep(0.02)
+        gelf_handler.close()
+        standalone.close()
+
+        self.assertEqual("", stderr.getvalue(), "no logging errors")
+        self.assertEqual(
+            f"GELF Handler test failed to connect to udp://127.0.0.1:{port}: [Errno 111] Connection refused",
+            self.test_handler2.records[0][1],
+        )
+
+
+class TestGelfHandler(TestHandler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.sent: List[bytes] = list()
+        self.released = Event()
+        self.released.set()
+
+    def convert_record_to_gelf(self, record: LogRecord) -> bytes:
+        return record.getMessage().encode()
+
+    def send_gelf(self, data: bytes) -> None:
+        self.released.wait()
+        if self.exception:
+            raise self.exception
+        self.sent.append(data)
+
+
+class CircuitBreakerErrorHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.gelf_handler = TestGelfHandler()
+        self.breaker = CircuitBreaker(failure_threshold=2, retry_delay=0.1)
+        self.handler = ErrorHandler(
+            self.gelf_handler, "test", "localhost", breaker=self.breaker
+        )
+
+        self.test_handler2 = TestHandler()
+        mylogger.addHandler(self.test_handler2)
+
+    def tearDown(self) -> None:
+        mylogger.removeHandler(self.test_handler2)
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/gelf_test.py", 24, msg, None, None)
+
+    def test_short_circuit(self):
+        self.gelf_handler.exception = ConnectionError("Expected Error")
+        for i in range(5):
+            self.handler.emit(self.record(f"Message{i}"))
+        self.assertEqual(3, self.handler.short_circuited)
+        self.assertEqual(
+            "GELF Handler test stops sending to localhost for up to 0.1 seconds",
+            self.test_handler2.records[-1][1],
+        )
+
+        time.sleep(0.15)
+        self.gelf_handler.exception = None
+        self.handler.emit(self.record("Message5"))
+        self.handler.emit(self.record("Message6"))
+        self.assertEqual([b"Message5", b"Message6"], self.gelf_handler.sent)
+
+    def test_record_error(self):
+        self.gelf_handler.exception = RuntimeError("Expected Error")
+        for i in range(5):
+            self.handler.emit(self.record(f"Message{i}"))
+        self.assertEqual(0, self.handler.short_circuited)
+
+    def closed_port(self, kind: int) -> int:
+        server = socket.socket(socket.AF_INET, kind)
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        server.close()
+        return port
+
+    def test_udp_unreachable(self):
+        port = self.closed_port(socket.SOCK_DGRAM)
+        gelf_handler = GelfUdpHandler("127.0.0.1", port)
+        handler = ErrorHandler(gelf_handler, "test", "localhost", breaker=self.breaker)
+        for i in range(5):
+            handler.emit(self.record(f"Message{i}"))
+            time.sleep(0.02)
+        gelf_handler.close()
+
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertEqual(2, handler.short_circuited)
+
+    def test_tcp_unreachable(self):
+        port = self.closed_port(socket.SOCK_STREAM)
+        gelf_handler = GelfTcpHandler("127.0.0.1", port)
+        handler = ErrorHandler(gelf_handler, "test", "localhost", breaker=self.breaker)
+        for i in range(5):
+            handler.emit(self.record(f"Message{i}"))
+        gelf_handler.close()
+
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertEqual(3, handler.short_circuited)
+
+
+class SpoolingErrorHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.gelf_handler = TestGelfHandler()
+        self.spool = Spool(self.directory.name)
+        self.handler = ErrorHandler(self.gelf_handler, "test", "localhost", self.spool)
+
+        self.test_handler2 = TestHandler()
+        mylogger.addHandler(self.test_handler2)
+
+    def tearDown(self) -> None:
+        mylogger.removeHandler(self.test_handler2)
+        self.spool.close()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/gelf_test.py", 24, msg, None, None)
+
+    def test_replay(self):
+        self.handler.emit(self.record("Message1"))
+        self.gelf_handler.exception = ConnectionError("Expected Error")
+        self.handler.emit(self.record("Message2"))
+        self.handler.emit(self.record("Message3"))
+        self.assertEqual([b"Message1"], self.gelf_handler.sent)
+        self.assertTrue(self.spool)
+
+        self.gelf_handler.exception = None
+        self.handler.emit(self.record("Message4"))
+        self.assertEqual(
+            [b"Message1", b"Message2", b"Message3", b"Message4"],
+            self.gelf_handler.sent,
+        )
+        self.assertFalse(self.spool)
+        self.assertEqual("WARNING", self.test_handler2.records[0][0])
+
+    def test_faulty_record(self):
+        send_gelf = self.gelf_handler.send_gelf
+
+        def send_or_reject(data: bytes) -> None:
+            if data.startswith(b"Large"):
+                raise MessageTooLarge("Expected Error")
+            send_gelf(data)
+
+        self.gelf_handler.send_gelf = send_or_reject  # type: ignore
+        self.handler.emit(self.record("Large1"))
+        self.assertFalse(self.spool, "a faulty record isn't spooled")
+
+        self.gelf_handler.exception = ConnectionError("Expected Error")
+        self.handler.emit(self.record("Message1"))
+        self.handler.emit(self.record("Large2"))
+        self.handler.emit(self.record("Message2"))
+        self.gelf_handler.exception = None
+        self.handler.emit(self.record("Message3"))
+
+        self.assertEqual(
+            [b"Message1", b"Message2", b"Message3"], self.gelf_handler.sent
+        )
+        self.assertFalse(self.spool, "a faulty record doesn't block the spool")
+
+    def test_udp_message_too_large(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(2)
+        gelf_handler = GelfUdpHandler(
+            "127.0.0.1", server.getsockname()[1], compress=False, chunk_size=100
+        )
+        handler = ErrorHandler(gelf_handler, "test", "localhost", self.spool)
+        handler.emit(self.record("before"))
+        handler.emit(self.record("x" * 20000))
+        for i in range(5):
+            handler.emit(self.record(f"after{i}"))
+        gelf_handler.close()
+
+        self.assertFalse(self.spool)
+        messages = list()
+        for _ in range(6):
+            data = server.recv(200)
+            if not data.startswith(b"\x1e\x0f"):  # chunks of the large message
+                messages.append(json.loads(data)["short_message"])
+        server.close()
+        self.assertEqual(["before"] + [f"after{i}" for i in range(5)], messages)
+
+    def test_tcp_unreachable(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        server.close()
+
+        gelf_handler = GelfTcpHandler("127.0.0.1", port)
+        handler = ErrorHandler(gelf_handler, "test", "localhost", self.spool)
+        for i in range(5):
+            handler.emit(self.record(f"Message{i}"))
+        gelf_handler.close()
+
+        sent: List[bytes] = list()
+        self.assertEqual(5, self.spool.replay(sent.append))
+        self.assertIn(b'"short_message":"Message4"', sent[-1])
+
+
+class AsyncHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.gelf_handler = TestGelfHandler()
+        self.error_handler = ErrorHandler(self.gelf_handler, "test", "localhost")
+
+        self.test_handler2 = TestHandler()
+        mylogger.addHandler(self.test_handler2)
+
+    def tearDown(self) -> None:
+        mylogger.removeHandler(self.test_handler2)
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/gelf_test.py", 24, msg, None, None)
+
+    def handler(self, overflow: str) -> AsyncHandler:
+        return AsyncHandler(self.gelf_handler, self.error_handler, 2, overflow)
+
+    def fill(self, handler: AsyncHandler) -> None:
+        self.gelf_handler.released.clear()
+        handler.emit(self.record("Message1"))
+        time.sleep(0.1)  # Message1 is taken by the sender thread
+        for i in range(2, 6):
+            handler.emit(self.record(f"Message{i}"))
+        self.gelf_handler.released.set()
+        handler.close()
+
+    def test_emit(self):
+        handler = self.handler(AsyncHandler.BLOCK)
+        handler.emit(self.record("Message1"))
+        handler.emit(self.record("Message2"))
+        handler.flush()
+        self.assertEqual([b"Message1", b"Message2"], self.gelf_handler.sent)
+        handler.close()
+
+    def test_drop_newest(self):
+        handler = self.handler(AsyncHandler.DROP_NEWEST)
+        self.fill(handler)
+        self.assertEqual(
+            [b"Message1", b"Message2", b"Message3"], self.gelf_handler.sent
+        )
+        self.assertEqual(2, handler.dropped)
+
+    def test_drop_oldest(self):
+        handler = self.handler(AsyncHandler.DROP_OLDEST)
+        self.fill(handler)
+        self.assertEqual(
+            [b"Message1", b"Message4", b"Message5"], self.gelf_handler.sent
+        )
+        self.assertEqual(2, handler.dropped)
+
+    def test_send_error(self):
+        handler = self.handler(AsyncHandler.BLOCK)
+        self.gelf_handler.exception = ConnectionError("Expected Error")
+        handler.emit(self.record("Message1"))
+        handler.flush()
+        handler.close()
+        record = self.test_handler2.records[0]
+        self.assertEqual("WARNING", record[0])
+        self.assertEqual(
+            "GELF Handler test failed to connect to localhost: Expected Error",
+            record[1],
+        )
+
+
+class FanOutHandlerTest(unittest.TestCase):
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/gelf_test.py", 24, msg, None, None)
+
+    def test_emit(self):
+        class CountingGelfHandler(TestGelfHandler):
+            converted = 0
+
+            def convert_record_to_gelf(self, record: LogRecord) -> bytes:
+                CountingGelfHandler.converted += 1
+                return super().convert_record_to_gelf(record)
+
+        gelf_handlers = [CountingGelfHandler(), CountingGelfHandler()]
+        error_handler = ErrorHandler(gelf_handlers[1], "test2", "localhost")
+        async_handler = AsyncHandler(gelf_handlers[1], error_handler)
+        handler = FanOutHandler(
+            [ErrorHandler(gelf_handlers[0], "test1", "localhost"), async_handler]
+        )
+
+        handler.emit(self.record("Message1"))
+        async_handler.flush()
+        async_handler.close()
+
+        self.assertEqual(1, CountingGelfHandler.converted)
+        self.assertEqual([b"Message1"], gelf_handlers[0].sent)
+        self.assertEqual([b"Message1"], gelf_handlers[1].sent)
@@ -0,0 +1,166 @@
+import unittest
+import http.client as httplib
+import json
+import time
+import zlib
+
+from threading import Thread
+from logging import LogRecord, INFO
+
+from encab_gelf.gelf.batch import GelfBatch
+from encab_gelf.gelf.handlers import GelfHttpHandler
+from encab_gelf.gelf.pool import HttpConnectionPool, HttpStatusError
+
+from tests.unit.gelf_server import GelfServer
+
+
+class HttpConnectionPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = GelfServer()
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        self.pool = HttpConnectionPool(
+            lambda: httplib.HTTPConnection(str(host), port, timeout=2)
+        )
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def test_reuse(self):
+        for i in range(3):
+            status = self.pool.request("POST", "/gelf", b"message%d" % i, {})
+            self.assertEqual(202, status)
+
+        self.assertEqual([b"message0", b"message1", b"message2"], self.server.bodies)
+        self.assertEqual(1, self.pool.misses)
+        self.assertEqual(2, self.pool.hits)
+        self.assertEqual(1, len(self.server.ports))
+
+    def test_connection_close(self):
+        self.server.close_connections = True
+        for i in range(2):
+            self.pool.request("POST", "/gelf", b"message", {})
+
+        self.assertEqual(2, self.pool.misses)
+        self.assertEqual(0, self.pool.hits)
+        self.assertEqual(2, len(self.server.ports))
+
+    def test_stale_connection(self):
+        self.server.drop_connections = True
+        self.pool.request("POST", "/gelf", b"message1", {})
+        self.server.drop_connections = False
+        self.pool.request("POST", "/gelf", b"message2", {})
+
+        self.assertEqual([b"message1", b"message2"], self.server.bodies)
+        self.assertEqual(1, self.pool.hits)
+        self.assertEqual(1, self.pool.reconnects)
+
+
+class GelfHttpHandlerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = GelfServer()
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.handler = GelfHttpHandler("127.0.0.1", self.server.server_address[1])
+
+    def tearDown(self) -> None:
+        self.handler.close()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/http_test.py", 24, msg, None, None)
+
+    def test_status(self):
+        self.handler.emit(self.record("Message 1"))
+
+        self.server.status = 503
+        with self.assertRaises(HttpStatusError) as context:
+            self.handler.emit(self.record("Message 2"))
+        self.assertFalse(context.exception.rejected)
+
+        self.server.status = 400
+        with self.assertRaises(HttpStatusError) as context:
+            self.handler.emit(self.record("Message 3"))
+        self.assertTrue(context.exception.rejected)
+
+
+class GelfBatchTest(unittest.TestCase):
+    def test_take(self):
+        batch = GelfBatch(compress=False)
+        self.assertIsNone(batch.take())
+        batch.add(b'{"a":1}')
+        batch.add(b'{"b":2}')
+        self.assertEqual(2, len(batch))
+        self.assertEqual(b'{"a":1}\n{"b":2}', batch.take())
+        self.assertEqual(0, len(batch))
+
+    def test_compressed(self):
+        batch = GelfBatch(compress=True)
+        batch.add(b'{"a":1}')
+        batch.add(b'{"b":2}')
+        self.assertEqual(b'{"a":1}\n{"b":2}', zlib.decompress(batch.take()))
+
+    def test_limits(self):
+        batch = GelfBatch(max_records=2, max_bytes=10, compress=False)
+        self.assertTrue(batch.fits(b"0123456789abc"))
+        batch.add(b"0123")
+        self.assertFalse(batch.is_full())
+        self.assertTrue(batch.fits(b"0123"))
+        self.assertFalse(batch.fits(b"012345"))
+        batch.add(b"0123")
+        self.assertTrue(batch.is_full())
+
+
+class GelfHttpHandlerBatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = GelfServer()
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def record(self, msg: str) -> LogRecord:
+        return LogRecord("test", INFO, "tests/unit/batch_test.py", 24, msg, None, None)
+
+    def messages(self, body: bytes):
+        return [
+            json.loads(line)["short_message"]
+            for line in zlib.decompress(body).split(b"\n")
+        ]
+
+    def test_max_records(self):
+        handler = GelfHttpHandler(
+            "127.0.0.1", self.port, batch=True, batch_max_records=2, batch_max_age=10
+        )
+        for i in range(5):
+            handler.emit(self.record(f"Message {i}"))
+
+        self.assertEqual(2, len(self.server.bodies))
+        handler.close()
+        self.assertEqual(
+            [["Message 0", "Message 1"], ["Message 2", "Message 3"], ["Message 4"]],
+            [self.messages(body) for body in self.server.bodies],
+        )
+
+    def test_max_age(self):
+        handler = GelfHttpHandler("127.0.0.1", self.port, batch=True, batch_max_age=0.1)
+        handler.emit(self.record("Message 1"))
+        handler.emit(self.record("Message 2"))
+        self.assertEqual([], self.server.bodies)
+        time.sleep(0.3)
+        self.assertEqual(
+            [["Message 1", "Message 2"]],
+            [self.messages(body) for body in self.server.bodies],
+        )
+        handler.close()
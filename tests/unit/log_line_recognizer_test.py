@@ -43,6 +43,7 @@ class MultiLineHandlerTest(unittest.TestCase):
     def test_emit(self):
         self.handler.emit(self.record(INFO, "Test Message1"))
         self.handler.emit(self.record(INFO, "Test Message2"))
+        self.handler.close()
         self.assertEqual(
             [("INFO", "Test Message1", {}), ("INFO", "Test Message2", {})],
             self.test_handler.records,
@@ -53,6 +54,7 @@ class MultiLineHandlerTest(unittest.TestCase):
         self.handler.emit(self.record(INFO, " Test Submessage1", False))
         self.handler.emit(self.record(INFO, " Test Submessage2", False))
         self.handler.emit(self.record(INFO, "Test Message2"))
+        self.handler.close()
 
         self.assertEqual(
             [
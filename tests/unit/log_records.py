@@ -0,0 +1,28 @@
+#
+# log records of programs and a handler that collects them, shared by the tests of the stages
+#
+
+from typing import List
+from logging import Handler, LogRecord, INFO
+
+from encab_gelf.handlers import ExtLogRecord
+
+
+class TestHandler(Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: List[ExtLogRecord] = list()
+
+    def emit(self, record: LogRecord) -> None:
+        self.records.append(ExtLogRecord.fromRecord(record))
+
+    @property
+    def messages(self) -> List[str]:
+        return [record.getMessage() for record in self.records]
+
+
+def record(msg: str, program: str = "program", level: int = INFO) -> LogRecord:
+    """:return: a log record of a program as encab emits it"""
+    record = LogRecord(program, level, "tests/unit/gelf_test.py", 24, msg, None, None)
+    record.extra = {"program": program}  # type: ignore
+    return record
@@ -0,0 +1,54 @@
+import unittest
+import time
+
+from logging import DEBUG, INFO
+
+from encab_gelf.handlers import Pipeline
+from encab_gelf.rate_limit import TokenBucket, RateLimitStage
+from tests.unit.log_records import TestHandler, record
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_take(self):
+        bucket = TokenBucket(rate=10, burst=2, now=0.0)
+        self.assertTrue(bucket.take(0.0))
+        self.assertTrue(bucket.take(0.0))
+        self.assertFalse(bucket.take(0.05))
+        self.assertTrue(bucket.take(0.1))
+        self.assertTrue(bucket.take(10.0))
+        self.assertTrue(bucket.take(10.0))
+        self.assertFalse(bucket.take(10.0), "no more than burst tokens")
+
+
+class RateLimitStageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.test_handler = TestHandler()
+
+    def test_limit(self):
+        stage = RateLimitStage(rate=0.001, burst=3, summary_interval=0.05)
+        pipeline = Pipeline("test", [stage], self.test_handler)
+        for _ in range(10):
+            pipeline.handle(record("Message", "noisy"))
+        pipeline.handle(record("Message", "quiet"))
+        pipeline.handle(record("Message", "encab"))
+        self.assertEqual(5, len(self.test_handler.records))
+
+        time.sleep(0.15)
+        summary = self.test_handler.records[-1]
+        self.assertEqual(6, len(self.test_handler.records))
+        self.assertEqual("noisy", summary.program)
+        self.assertEqual(7, summary.extra["_suppressed_lines"])
+        self.assertIn("7 log lines of noisy", summary.getMessage())
+
+    def test_levels(self):
+        stage = RateLimitStage(rate=0, levels={"debug": 0.001})
+        pipeline = Pipeline("test", [stage], self.test_handler)
+        for _ in range(3):
+            pipeline.handle(record("Message", "program", DEBUG))
+            pipeline.handle(record("Message", "program", INFO))
+        self.assertEqual(4, len(self.test_handler.records))
+
+        pipeline.close()
+        self.assertEqual(5, len(self.test_handler.records))
+        self.assertEqual(2, self.test_handler.records[-1].extra["_suppressed_lines"])
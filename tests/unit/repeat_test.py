@@ -0,0 +1,47 @@
+import unittest
+import time
+
+from encab_gelf.handlers import Pipeline
+from encab_gelf.repeat import RepeatStage
+from tests.unit.log_records import TestHandler, record
+
+
+class RepeatStageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.test_handler = TestHandler()
+
+    def test_collapse(self):
+        pipeline = Pipeline("test", [RepeatStage(0.05)], self.test_handler)
+        for i in range(5):
+            pipeline.handle(record(f"Retry {i} failed"))
+        pipeline.handle(record("Retry 1 failed", "other"))
+        pipeline.handle(record("Connected"))
+        self.assertEqual(
+            ["Retry 0 failed", "Retry 1 failed", "Connected"],
+            self.test_handler.messages,
+        )
+
+        time.sleep(0.15)
+        self.assertEqual(4, len(self.test_handler.records))
+        summary = self.test_handler.records[-1]
+        self.assertEqual("Retry 4 failed", summary.getMessage())
+        self.assertEqual(4, summary.extra["_repeat_count"])
+        self.assertEqual("program", summary.extra["program"])
+        self.assertTrue(
+            summary.extra["_first_timestamp"] <= summary.extra["_last_timestamp"]
+        )
+
+        pipeline.handle(record("Retry 5 failed"))
+        self.assertEqual(
+            "Retry 5 failed", self.test_handler.messages[-1], "a new window"
+        )
+
+    def test_flush(self):
+        pipeline = Pipeline("test", [RepeatStage(10)], self.test_handler)
+        for _ in range(3):
+            pipeline.handle(record("Crashed"))
+        pipeline.close()
+
+        self.assertEqual(["Crashed", "Crashed"], self.test_handler.messages)
+        self.assertEqual(2, self.test_handler.records[-1].extra["_repeat_count"])
@@ -0,0 +1,66 @@
+import unittest
+import time
+
+from threading import Event
+from typing import List
+
+from encab_gelf.scheduler import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        # a single worker calls the functions in the order they are due
+        self.scheduler = Scheduler(workers=1)
+        self.called: List[str] = list()
+        self.done = Event()
+
+    def tearDown(self) -> None:
+        self.scheduler.close()
+        super().tearDown()
+
+    def call(self, name: str) -> None:
+        self.called.append(name)
+        if name == "last":
+            self.done.set()
+
+    def test_order(self):
+        self.scheduler.schedule(0.2, self.call, "last")
+        self.scheduler.schedule(0.1, self.call, "second")
+        self.scheduler.schedule(0.05, self.call, "first")
+        self.scheduler.schedule(0.1, self.call, "third")
+
+        self.assertTrue(self.done.wait(1))
+        self.assertEqual(["first", "second", "third", "last"], self.called)
+
+    def test_cancel(self):
+        self.scheduler.schedule(0.05, self.call, "cancelled").cancel()
+        self.scheduler.schedule(0.1, self.call, "last")
+
+        self.assertTrue(self.done.wait(1))
+        self.assertEqual(["last"], self.called)
+
+    def test_failure(self):
+        self.scheduler.schedule(0.01, self.fail_call)
+        self.scheduler.schedule(0.02, self.call, "last")
+
+        self.assertTrue(self.done.wait(1), "a failed call doesn't stop the scheduler")
+
+    def fail_call(self) -> None:
+        raise ValueError("Expected Error")
+
+    def test_blocking(self):
+        self.scheduler.close()
+        self.scheduler = Scheduler(workers=2)
+        released = Event()
+        self.scheduler.schedule(0.01, released.wait, 2)
+        self.scheduler.schedule(0.05, self.call, "last")
+
+        self.assertTrue(self.done.wait(1), "a blocking call doesn't delay others")
+        released.set()
+
+    def test_close(self):
+        self.scheduler.schedule(0.05, self.call, "last")
+        self.scheduler.close()
+        time.sleep(0.1)
+        self.assertEqual([], self.called)
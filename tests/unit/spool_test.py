@@ -0,0 +1,95 @@
+import unittest
+import os
+import tempfile
+
+from typing import List
+
+from encab_gelf.spool import Spool
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.sent: List[bytes] = list()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def spool(self, max_bytes: int = 1000, segment_bytes: int = 100) -> Spool:
+        return Spool(self.directory.name, max_bytes, segment_bytes)
+
+    def send(self, data: bytes) -> None:
+        if data == b"fail":
+            raise ConnectionError("Expected Error")
+        self.sent.append(data)
+
+    def test_replay(self):
+        spool = self.spool()
+        for i in range(20):
+            spool.append(f"Message{i}".encode())
+        self.assertTrue(len(os.listdir(self.directory.name)) > 1)
+
+        self.assertEqual(20, spool.replay(self.send))
+        self.assertEqual([f"Message{i}".encode() for i in range(20)], self.sent)
+        self.assertFalse(spool)
+        self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_replay_failure(self):
+        spool = self.spool()
+        spool.append(b"Message1")
+        spool.append(b"fail")
+        spool.append(b"Message2")
+
+        with self.assertRaises(ConnectionError):
+            spool.replay(self.send)
+        self.assertEqual([b"Message1"], self.sent)
+
+        spool.append(b"Message3")
+        self.sent.append(b"--")
+        with self.assertRaises(ConnectionError):
+            spool.replay(self.send)
+        self.assertEqual([b"Message1", b"--"], self.sent)
+        self.assertTrue(spool)
+
+    def test_evict_oldest(self):
+        spool = self.spool(max_bytes=200, segment_bytes=60)
+        for i in range(30):
+            spool.append(f"Message{i:02d}".encode())
+
+        self.assertTrue(spool.size <= 200)
+        self.assertTrue(spool.evicted > 0)
+        spool.replay(self.send)
+        self.assertEqual(b"Message29", self.sent[-1])
+        self.assertTrue(len(self.sent) < 30)
+        self.assertEqual(
+            sorted(self.sent), self.sent, "oldest messages are evicted first"
+        )
+
+    def test_restart(self):
+        spool = self.spool()
+        spool.append(b"Message1")
+        spool.append(b"Message2")
+        spool.close()
+
+        # a message interrupted by a crash is skipped
+        with open(spool.segments[-1].path, "ab") as file:
+            file.write(b"\x00\x00\x00\x10Mess")
+
+        spool = self.spool()
+        spool.append(b"Message3")
+        self.assertEqual(3, spool.replay(self.send))
+        self.assertEqual([b"Message1", b"Message2", b"Message3"], self.sent)
+
+    def test_foreign_files(self):
+        with open(os.path.join(self.directory.name, "backup.spool"), "wb") as file:
+            file.write(b"\x00\x00\x00\x08Message0")
+
+        spool = self.spool()
+        spool.append(b"Message1")
+        self.assertEqual(1, spool.replay(self.send))
+        self.assertEqual([b"Message1"], self.sent)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory.name, "backup.spool"))
+        )